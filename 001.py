@@ -1,5 +1,8 @@
+import codecs
 import heapq
+import sys
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 # 節點類別：代表 Huffman Tree 的每一個節點
 class HuffmanNode:
@@ -33,11 +36,14 @@ def build_huffman_tree(freq_map):
 def generate_codes(node, prefix="", huffman_codes=None):
     if huffman_codes is None:
         huffman_codes = {}
-    if node:
-        if node.char:  # 是葉節點
-            huffman_codes[node.char] = prefix
-        generate_codes(node.left, prefix + "0", huffman_codes)
-        generate_codes(node.right, prefix + "1", huffman_codes)
+    stack = [(node, prefix)]  # 用 stack 取代遞迴，樹很深也不會超過遞迴上限
+    while stack:
+        node, prefix = stack.pop()
+        if node:
+            if node.char:  # 是葉節點
+                huffman_codes[node.char] = prefix
+            stack.append((node.right, prefix + "1"))
+            stack.append((node.left, prefix + "0"))
     return huffman_codes
 
 # 壓縮文字：轉為 Huffman 編碼
@@ -57,30 +63,710 @@ def decompress(encoded_binary, root):
 
     return ''.join(result)
 
-# === 測試 ===
-input_text = "SeatA3Ticket12"
-freq_map = Counter(input_text)
-
-root_node = build_huffman_tree(freq_map)
-huffman_codes = generate_codes(root_node)
-encoded_binary = compress(input_text, huffman_codes)
-decoded_text = decompress(encoded_binary, root_node)
-
-# === 輸出結果 ===
-print("🔹 Original Text:", input_text)
-print("🔸 Huffman Codes:")
-for char, code in huffman_codes.items():
-    print(f"  '{char}': {code}")
-print("🔹 Encoded Binary:", encoded_binary)
-print("🔹 Decoded Text:  ", decoded_text)
-
-# === 壓縮比例 ===
-original_bits = len(input_text) * 8
-compressed_bits = len(encoded_binary)
-print("\n📊 Compression Ratio:")
-print(f"  Original size: {original_bits} bits")
-print(f"  Compressed size: {compressed_bits} bits")
-print(f"  Compression Rate: {compressed_bits / original_bits:.2%}")
+# 查表解碼預設一次看幾個 bit（表大小為 2^bits）
+DEFAULT_TABLE_BITS = 12
+
+# 把 '0'/'1' 字串編碼表轉成 (整數值, 長度)；只有一種字元時編碼為空字串，改用 1 個 bit
+def _code_table(huffman_codes):
+    table = {}
+    for char, code in huffman_codes.items():
+        table[char] = (int(code, 2), len(code)) if code else (0, 1)
+    return table
+
+# 壓縮文字為 bit-packed bytes：第 1 個 byte 記錄最後補了幾個 0 (padding)，之後是實際資料
+def compress_bytes(input_text, huffman_codes):
+    table = _code_table(huffman_codes)
+    out = bytearray(1)
+    acc = 0       # 尚未寫出的 bit
+    nbits = 0     # acc 內的 bit 數
+    for char in input_text:
+        value, length = table[char]
+        acc = (acc << length) | value
+        nbits += length
+        if nbits >= 256:  # 累積一段再整批寫出，減少 to_bytes 呼叫次數
+            rest = nbits & 7
+            out += (acc >> rest).to_bytes((nbits - rest) >> 3, 'big')
+            acc &= (1 << rest) - 1
+            nbits = rest
+    padding = -nbits & 7
+    if nbits:
+        out += (acc << padding).to_bytes((nbits + padding) >> 3, 'big')
+    out[0] = padding
+    return bytes(out)
+
+# 查表解碼用的表格：每個 bits 長度的 pattern 對應「可完整解出的字元」與用掉的 bit 數
+# 建表只花 O(字母數 + 2^bits)：每個編碼填一段連續的 pattern，多字元的項目等查到時才算
+class HuffmanDecodeTable:
+    def __init__(self, huffman_codes, table_bits=None):
+        codes = _code_table(huffman_codes)
+        self.max_len = max(length for _, length in codes.values())
+        # 表格不必比最長的編碼還寬
+        self.bits = min(table_bits or DEFAULT_TABLE_BITS, self.max_len)
+        size = 1 << self.bits
+        # 比表格還長的編碼，另外用 (長度, 值) 查
+        self.long_codes = {(length, value): char for char, (value, length) in codes.items()
+                           if length > self.bits}
+        # first_chars / first_lengths = pattern 開頭那個編碼的字元與長度；
+        # 以某個編碼開頭的 pattern 是一段連續範圍，一個編碼一次切片填完
+        self.first_chars = [None] * size
+        self.first_lengths = [0] * size
+        for char, (value, length) in codes.items():
+            if length <= self.bits:
+                start = value << (self.bits - length)
+                end = (value + 1) << (self.bits - length)
+                self.first_chars[start:end] = [char] * (end - start)
+                self.first_lengths[start:end] = [length] * (end - start)
+        # 依 pattern 索引的平行 list（不用 tuple，查表時省掉拆解的成本）：
+        # texts = 可完整解出的字串，used = 用掉的 bit 數（0 表示還沒填，或第一個編碼就比表格長）
+        self.texts = [''] * size
+        self.used = [0] * size
+
+    # 算出 pattern 一次能解出的字元並存起來，回傳用掉的 bit 數
+    def fill(self, pattern):
+        mask = (1 << self.bits) - 1
+        chars = []
+        used = 0
+        while used < self.bits:
+            rest = (pattern << used) & mask  # 還沒用到的 bit 移到最前面
+            length = self.first_lengths[rest]
+            if not length or used + length > self.bits:
+                break
+            chars.append(self.first_chars[rest])
+            used += length
+        self.texts[pattern] = ''.join(chars)
+        self.used[pattern] = used
+        return used
+
+# 用查表方式解碼：payload 為 bytes，total_bits 為有效 bit 數
+def _table_decode(payload, total_bits, table):
+    texts = table.texts
+    useds = table.used
+    k = table.bits
+    mask = (1 << k) - 1
+    from_bytes = int.from_bytes
+    result = []
+    append = result.append
+    acc = 0
+    nbits = 0
+    pos = 0
+    size = len(payload)
+    fast_end = size - 8  # 最後一個 byte 含 padding，快速迴圈不會讀到它
+    while True:
+        # 快速迴圈：一次補 7 byte，buffer 裡都是有效 bit，不必檢查結尾
+        while pos <= fast_end:
+            acc = (acc << 56) | from_bytes(payload[pos:pos + 7], 'big')
+            pos += 7
+            nbits += 56
+            while nbits >= k:
+                pattern = (acc >> (nbits - k)) & mask
+                used = useds[pattern]
+                if not used:
+                    break
+                append(texts[pattern])  # 一次查表解出多個字元
+                nbits -= used
+            acc &= (1 << nbits) - 1
+            if nbits >= k:
+                break  # 項目還沒填或編碼比表格長，交給下面逐步處理
+
+        # 逐步處理一次查表：結尾附近或比表格長的編碼
+        remaining = total_bits - (pos * 8 - nbits)
+        if remaining <= 0:
+            break
+        while nbits < k and pos < size:
+            acc = (acc << 8) | payload[pos]
+            pos += 1
+            nbits += 8
+        if nbits >= k:
+            pattern = (acc >> (nbits - k)) & mask
+        else:
+            pattern = (acc << (k - nbits)) & mask
+        used = useds[pattern]
+        length = table.first_lengths[pattern]
+        if not used and length:
+            used = table.fill(pattern)
+        if used and used <= remaining:
+            append(texts[pattern])
+        elif length and length <= remaining:
+            append(table.first_chars[pattern])  # 接近結尾時只取一個字元，避免讀到 padding
+            used = length
+        else:
+            # 編碼比表格長：逐 bit 往後找
+            for used in range(k + 1, table.max_len + 1):
+                while nbits < used and pos < size:
+                    acc = (acc << 8) | payload[pos]
+                    pos += 1
+                    nbits += 8
+                if used > min(nbits, remaining):
+                    raise ValueError("Huffman 資料不完整或編碼表不符")
+                value = (acc >> (nbits - used)) & ((1 << used) - 1)
+                char = table.long_codes.get((used, value))
+                if char is not None:
+                    append(char)
+                    break
+            else:
+                raise ValueError("Huffman 資料不完整或編碼表不符")
+        nbits -= used
+        acc &= (1 << nbits) - 1
+    return ''.join(result)
+
+# 解壓縮 compress_bytes() 的結果，可傳入已建好的 HuffmanDecodeTable 重複使用
+def decompress_bytes(packed, huffman_codes, table=None):
+    if table is None:
+        table = HuffmanDecodeTable(huffman_codes)
+    padding = packed[0]
+    payload = memoryview(packed)[1:]
+    return _table_decode(payload, len(payload) * 8 - padding, table)
+
+# ========== Canonical Huffman：只靠編碼長度就能重建編碼表 ==========
+
+# 走訪 Huffman Tree，取得每個字元的編碼長度（用 stack 迭代，不會遞迴過深）
+def code_lengths(root):
+    lengths = {}
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.left is None and node.right is None:
+            lengths[node.char] = max(depth, 1)  # 只有一種字元時仍給 1 個 bit
+        else:
+            stack.append((node.right, depth + 1))
+            stack.append((node.left, depth + 1))
+    return lengths
+
+# 依 (長度, 字元) 排序後依序配發編碼，得到 canonical Huffman 編碼表
+def canonical_codes(lengths):
+    huffman_codes = {}
+    code = 0
+    prev_len = 0
+    for char, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - prev_len
+        huffman_codes[char] = format(code, f'0{length}b')
+        code += 1
+        prev_len = length
+    return huffman_codes
+
+# Package-merge：在編碼長度不超過 max_length 的限制下，求最佳的編碼長度
+def limited_code_lengths(freq_map, max_length):
+    symbols = sorted(freq_map.items(), key=lambda item: (item[1], item[0]))
+    if len(symbols) == 1:
+        return {symbols[0][0]: 1}
+    if (1 << max_length) < len(symbols):
+        raise ValueError(f"{len(symbols)} 種字元無法用最長 {max_length} bit 的編碼表示")
+    # 每個項目為 (權重, 內容)：內容是字元索引 (葉) 或 (項目, 項目) (package)
+    leaves = [(freq, index) for index, (_, freq) in enumerate(symbols)]
+    current = leaves
+    for _ in range(max_length - 1):
+        packages = [(current[i][0] + current[i + 1][0], (current[i], current[i + 1]))
+                    for i in range(0, len(current) - 1, 2)]
+        current = list(heapq.merge(leaves, packages, key=lambda item: item[0]))
+    # 取前 2n-2 個項目，每個字元出現幾次就是它的編碼長度
+    counts = [0] * len(symbols)
+    stack = current[:2 * len(symbols) - 2]
+    while stack:
+        _, content = stack.pop()
+        if isinstance(content, int):
+            counts[content] += 1
+        else:
+            stack.extend(content)
+    return {char: counts[index] for index, (char, _) in enumerate(symbols)}
+
+# 依頻率決定每個字元的編碼長度；有給 max_code_length 時改用 package-merge 限制長度
+def model_code_lengths(freq_map, max_code_length=None):
+    if not freq_map:
+        return {}
+    if max_code_length is None:
+        return code_lengths(build_huffman_tree(freq_map))
+    return limited_code_lengths(freq_map, max_code_length)
+
+# 可變長度整數（每 byte 7 bit，最高位元表示後面還有）
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+# 標頭：字元數量，接著依 canonical 順序寫出 (字元 code point, 編碼長度)
+def _write_code_lengths(out, lengths):
+    _write_varint(out, len(lengths))
+    for char, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        _write_varint(out, ord(char))
+        out.append(length)
+
+def _read_code_lengths(data, pos):
+    count, pos = _read_varint(data, pos)
+    lengths = {}
+    for _ in range(count):
+        code_point, pos = _read_varint(data, pos)
+        lengths[chr(code_point)] = data[pos]
+        pos += 1
+    return lengths, pos
+
+# 壓縮為「標頭 + bit-packed 資料」，解碼端不需要 HuffmanNode 樹；max_code_length 可限制最長編碼
+def compress_canonical(input_text, max_code_length=None):
+    lengths = model_code_lengths(Counter(input_text), max_code_length)
+    out = bytearray()
+    _write_code_lengths(out, lengths)
+    out += compress_bytes(input_text, canonical_codes(lengths))
+    return bytes(out)
+
+# 只從標頭重建編碼表與查表解碼器
+def decompress_canonical(data):
+    lengths, pos = _read_code_lengths(data, 0)
+    if not lengths:
+        return ''
+    return decompress_bytes(memoryview(data)[pos:], canonical_codes(lengths))
+
+# ========== 串流壓縮：檔案物件或 chunk iterator，記憶體用量固定 ==========
+# 格式：varint(標頭長度) + 標頭，接著每個 chunk 一個 frame：varint(長度) + compress_bytes() 結果，
+#       最後以長度 0 的 frame 結尾
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+# 從檔案物件（有 read）或 iterator 逐段取出資料
+def _iter_raw_chunks(source, chunk_size):
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+# 逐段取出文字；binary 來源以 UTF-8 逐段解碼（多位元組字元被切在兩段之間也能正確接起來）
+def _iter_chunks(source, chunk_size):
+    decoder = None
+    for chunk in _iter_raw_chunks(source, chunk_size):
+        if isinstance(chunk, (bytes, bytearray)):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        if not chunk:  # 空的 chunk 不產生 frame
+            continue
+        yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+# 檔案物件能不能回到開頭重讀（pipe / stdin 不行）
+def _can_rewind(source):
+    seekable = getattr(source, 'seekable', None)
+    if seekable is not None:
+        return seekable()
+    return hasattr(source, 'seek') and hasattr(source, 'tell')
+
+# 把 bytes chunk 的 iterator 包成有 read(n) 的物件
+class _ChunkReader:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Huffman 串流提前結束")
+    return data
+
+def _read_varint_from(stream):
+    value = 0
+    shift = 0
+    while True:
+        byte = _read_exact(stream, 1)[0]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value
+        shift += 7
+
+# 第一輪：逐段統計字元頻率
+def count_frequencies(source, chunk_size=STREAM_CHUNK_SIZE):
+    freq_map = Counter()
+    for chunk in _iter_chunks(source, chunk_size):
+        freq_map.update(chunk)
+    return freq_map
+
+# 第二輪：逐段壓縮並 yield bytes；沒給 freq_map 時先掃一遍來源（只限可 seek 的檔案或可重複走訪的來源）
+def iter_compress(source, freq_map=None, chunk_size=STREAM_CHUNK_SIZE, max_code_length=None):
+    if freq_map is None:
+        if hasattr(source, 'read'):
+            if not _can_rewind(source):
+                raise ValueError("pipe / stdin 無法重新讀取，請先傳入 freq_map")
+            start = source.tell()
+            freq_map = count_frequencies(source, chunk_size)
+            source.seek(start)
+        elif iter(source) is source:
+            raise ValueError("iterator 只能走訪一次，請先傳入 freq_map")
+        else:
+            freq_map = count_frequencies(source, chunk_size)
+    lengths = model_code_lengths(freq_map, max_code_length)
+    huffman_codes = canonical_codes(lengths)
+
+    header = bytearray()
+    _write_code_lengths(header, lengths)
+    frame = bytearray()
+    _write_varint(frame, len(header))
+    yield bytes(frame + header)
+
+    for chunk in _iter_chunks(source, chunk_size):
+        packed = compress_bytes(chunk, huffman_codes)
+        frame = bytearray()
+        _write_varint(frame, len(packed))
+        yield bytes(frame) + packed
+    yield b'\x00'
+
+# 逐 frame 解壓縮並 yield 文字；source 可以是 binary 檔案物件或 bytes chunk iterator
+# （壓縮時若來源是 binary，解出的是它以 UTF-8 解碼後的文字）
+def iter_decompress(source):
+    stream = source if hasattr(source, 'read') else _ChunkReader(source)
+    header = _read_exact(stream, _read_varint_from(stream))
+    lengths, _ = _read_code_lengths(header, 0)
+    huffman_codes = canonical_codes(lengths)
+    table = HuffmanDecodeTable(huffman_codes) if lengths else None
+    while True:
+        size = _read_varint_from(stream)
+        if size == 0:
+            return
+        data = _read_exact(stream, size)
+        # 標頭是空的代表原文沒有任何字元
+        yield decompress_bytes(data, huffman_codes, table) if table else ''
+
+# 把 source 壓縮寫入 dest（binary），回傳寫出的 byte 數
+def compress_stream(source, dest, freq_map=None, chunk_size=STREAM_CHUNK_SIZE, max_code_length=None):
+    written = 0
+    for data in iter_compress(source, freq_map, chunk_size, max_code_length):
+        dest.write(data)
+        written += len(data)
+    return written
+
+# 把 source 解壓縮寫入 dest（文字），回傳寫出的字元數
+def decompress_stream(source, dest):
+    written = 0
+    for text in iter_decompress(source):
+        dest.write(text)
+        written += len(text)
+    return written
+
+# ========== 區塊模式：切成固定大小區塊，用多個 CPU 平行壓縮 / 解壓縮 ==========
+# 格式：1 byte 模式 (0 = 每塊各自的模型, 1 = 共用模型)，共用模型時接 varint(標頭長度) + 標頭，
+#       接著 varint(區塊數) 與每塊的 varint(byte 長度) 索引，最後是各區塊資料。
+# 有索引就能直接跳到第 N 塊解碼，不必先解前面的區塊。
+# 注意：worker 以 spawn 啟動時會重新執行本檔的頂層程式，平行模式請在 fork 平台或 __main__ 保護下使用。
+
+BLOCK_SIZE = 1 << 20
+
+# 依 workers 決定直接執行或丟進 ProcessPoolExecutor
+def _map_blocks(func, jobs, workers=None):
+    if workers == 1 or len(jobs) <= 1:
+        return list(map(func, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, jobs))
+
+def _compress_block(job):
+    block, huffman_codes, max_code_length = job
+    if huffman_codes is None:
+        return compress_canonical(block, max_code_length)
+    return compress_bytes(block, huffman_codes)
+
+def _decompress_block(job):
+    data, huffman_codes, table = job
+    if huffman_codes is None:
+        return decompress_canonical(data)
+    return decompress_bytes(data, huffman_codes, table)
+
+# 區塊壓縮：shared_model=True 時全部區塊共用一份頻率模型（頻率也是分塊平行統計後加總）
+def compress_blocks(input_text, block_size=BLOCK_SIZE, shared_model=False, workers=None,
+                    max_code_length=None):
+    blocks = [input_text[i:i + block_size] for i in range(0, len(input_text), block_size)]
+    out = bytearray()
+    if shared_model:
+        freq_map = sum(_map_blocks(Counter, blocks, workers), Counter())
+        lengths = model_code_lengths(freq_map, max_code_length)
+        huffman_codes = canonical_codes(lengths)
+        header = bytearray()
+        _write_code_lengths(header, lengths)
+        out.append(1)
+        _write_varint(out, len(header))
+        out += header
+    else:
+        huffman_codes = None
+        out.append(0)
+    packed = _map_blocks(_compress_block, [(block, huffman_codes, max_code_length) for block in blocks],
+                         workers)
+    _write_varint(out, len(packed))
+    for data in packed:
+        _write_varint(out, len(data))
+    for data in packed:
+        out += data
+    return bytes(out)
+
+# 解析區塊容器的標頭與索引，回傳 (共用編碼表或 None, 每塊的 (起點, 終點))
+def _read_block_index(container):
+    pos = 1
+    huffman_codes = None
+    if container[0] == 1:
+        size, pos = _read_varint(container, pos)
+        lengths, _ = _read_code_lengths(container, pos)
+        huffman_codes = canonical_codes(lengths)
+        pos += size
+    count, pos = _read_varint(container, pos)
+    sizes = []
+    for _ in range(count):
+        size, pos = _read_varint(container, pos)
+        sizes.append(size)
+    spans = []
+    for size in sizes:
+        spans.append((pos, pos + size))
+        pos += size
+    return huffman_codes, spans
+
+# 只解第 block_index 塊
+def decompress_block(container, block_index):
+    huffman_codes, spans = _read_block_index(container)
+    start, end = spans[block_index]
+    return _decompress_block((memoryview(container)[start:end], huffman_codes, None))
+
+# 平行解開全部區塊並依序接回
+def decompress_blocks(container, workers=None):
+    huffman_codes, spans = _read_block_index(container)
+    # 共用模型時只建一份解碼表，所有區塊共用
+    table = HuffmanDecodeTable(huffman_codes) if huffman_codes else None
+    jobs = [(bytes(container[start:end]), huffman_codes, table) for start, end in spans]
+    return ''.join(_map_blocks(_decompress_block, jobs, workers))
+
+# ========== Adaptive Huffman (FGK)：邊讀邊更新模型，單次走訪即可壓縮 ==========
+# 編碼端與解碼端各自維護同一棵樹，每處理一個字元就更新一次，不需要事先統計頻率。
+# 第一次出現的字元以 NYT (Not Yet Transmitted) 節點的編碼 + 原始字元表示：
+#   旗標 0 + 8 bit（code point < 256）或 旗標 1 + 21 bit（其餘 Unicode）。
+
+class AdaptiveHuffmanNode(HuffmanNode):
+    def __init__(self, char=None, freq=0, parent=None):
+        super().__init__(char, freq)
+        self.parent = parent  # 父節點，用來從葉節點往上找出編碼
+        self.order = 0        # 在 nodes 中的位置，位置越前面編號越高
+
+class AdaptiveHuffmanModel:
+    def __init__(self):
+        self.root = self.nyt = AdaptiveHuffmanNode()
+        self.nodes = [self.root]  # 依編號由高到低排列，權重由大到小（sibling property）
+        self.leaves = {}          # 字元 → 葉節點
+
+    # 從節點往上走到根，回傳 (編碼值, 長度)
+    def code(self, node):
+        value = 0
+        length = 0
+        while node.parent is not None:
+            if node is node.parent.right:
+                value |= 1 << length
+            length += 1
+            node = node.parent
+        return value, length
+
+    # 同權重中編號最高的節點
+    def _block_leader(self, node):
+        index = node.order
+        while index > 0 and self.nodes[index - 1].freq == node.freq:
+            index -= 1
+        return self.nodes[index]
+
+    # 交換兩棵子樹的位置與編號
+    def _swap(self, a, b):
+        parent_a, parent_b = a.parent, b.parent
+        if parent_a is parent_b:
+            parent_a.left, parent_a.right = parent_a.right, parent_a.left
+        else:
+            if parent_a.left is a:
+                parent_a.left = b
+            else:
+                parent_a.right = b
+            if parent_b.left is b:
+                parent_b.left = a
+            else:
+                parent_b.right = a
+            a.parent, b.parent = parent_b, parent_a
+        self.nodes[a.order], self.nodes[b.order] = b, a
+        a.order, b.order = b.order, a.order
+
+    # 字元出現一次後更新樹：新字元先從 NYT 分裂出葉節點，再沿路往上加權重
+    def update(self, char):
+        node = self.leaves.get(char)
+        if node is None:
+            old_nyt = self.nyt
+            node = AdaptiveHuffmanNode(char, parent=old_nyt)
+            self.nyt = AdaptiveHuffmanNode(parent=old_nyt)
+            old_nyt.left, old_nyt.right = self.nyt, node
+            node.order = len(self.nodes)
+            self.nodes.append(node)
+            self.nyt.order = len(self.nodes)
+            self.nodes.append(self.nyt)
+            self.leaves[char] = node
+        while node is not None:
+            leader = self._block_leader(node)
+            if leader is not node and leader is not node.parent:
+                self._swap(node, leader)
+            node.freq += 1
+            node = node.parent
+
+class AdaptiveHuffmanEncoder:
+    def __init__(self):
+        self.model = AdaptiveHuffmanModel()
+        self.acc = 0    # 尚未湊滿 1 byte 的 bit
+        self.nbits = 0
+
+    # 編碼一段文字，回傳目前已湊滿的 bytes；剩下的 bit 留到下次或 flush()
+    def encode(self, text):
+        model = self.model
+        out = bytearray()
+        acc, nbits = self.acc, self.nbits
+        for char in text:
+            node = model.leaves.get(char)
+            if node is None:
+                value, length = model.code(model.nyt)
+                code_point = ord(char)
+                if code_point < 0x100:
+                    value, length = (value << 9) | code_point, length + 9
+                else:
+                    value, length = (((value << 1) | 1) << 21) | code_point, length + 22
+            else:
+                value, length = model.code(node)
+            acc = (acc << length) | value
+            nbits += length
+            model.update(char)
+            if nbits >= 256:
+                rest = nbits & 7
+                out += (acc >> rest).to_bytes((nbits - rest) >> 3, 'big')
+                acc &= (1 << rest) - 1
+                nbits = rest
+        rest = nbits & 7
+        if nbits > rest:
+            out += (acc >> rest).to_bytes((nbits - rest) >> 3, 'big')
+            acc &= (1 << rest) - 1
+        self.acc, self.nbits = acc, rest
+        return bytes(out)
+
+    # 結束串流：用 NYT 編碼的開頭補滿最後一個 byte，解碼端不會把它當成完整字元
+    def flush(self):
+        if not self.nbits:
+            return b''
+        padding = 8 - self.nbits
+        value, length = self.model.code(self.model.nyt)
+        filler = (value << 9) >> (length + 9 - padding)
+        data = bytes([((self.acc << padding) | filler) & 0xFF])
+        self.acc = self.nbits = 0
+        return data
+
+class AdaptiveHuffmanDecoder:
+    def __init__(self):
+        self.model = AdaptiveHuffmanModel()
+        self.buffer = bytearray()
+        self.bitpos = 0  # buffer 中下一個未讀的 bit
+
+    def _bit(self, pos):
+        return (self.buffer[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    # 放入新收到的 bytes，回傳其中可以完整解出的字元
+    def decode(self, data):
+        self.buffer += data
+        model = self.model
+        total = len(self.buffer) * 8
+        pos = self.bitpos
+        result = []
+        while True:
+            node = model.root
+            while node.left is not None and pos < total:
+                node = node.right if self._bit(pos) else node.left
+                pos += 1
+            if node.left is not None:
+                break  # 資料不夠走到葉節點，等下一段
+            if node is model.nyt:
+                if pos >= total:
+                    break
+                width = 21 if self._bit(pos) else 8
+                if pos + 1 + width > total:
+                    break
+                code_point = 0
+                for i in range(pos + 1, pos + 1 + width):
+                    code_point = (code_point << 1) | self._bit(i)
+                pos += 1 + width
+                char = chr(code_point)
+            else:
+                char = node.char
+            result.append(char)
+            model.update(char)
+            self.bitpos = pos
+        # 丟掉已經讀完的 bytes
+        consumed = self.bitpos >> 3
+        del self.buffer[:consumed]
+        self.bitpos -= consumed * 8
+        return ''.join(result)
+
+def adaptive_compress(input_text):
+    encoder = AdaptiveHuffmanEncoder()
+    return encoder.encode(input_text) + encoder.flush()
+
+def adaptive_decompress(data):
+    return AdaptiveHuffmanDecoder().decode(data)
+
+# --expr-batch（運算式批次模式）時不印範例，stdout 只留給計算結果
+if "--expr-batch" not in sys.argv:
+    # === 測試 ===
+    input_text = "SeatA3Ticket12"
+    freq_map = Counter(input_text)
+
+    root_node = build_huffman_tree(freq_map)
+    huffman_codes = generate_codes(root_node)
+    encoded_binary = compress(input_text, huffman_codes)
+    decoded_text = decompress(encoded_binary, root_node)
+
+    # === 輸出結果 ===
+    print("🔹 Original Text:", input_text)
+    print("🔸 Huffman Codes:")
+    for char, code in huffman_codes.items():
+        print(f"  '{char}': {code}")
+    print("🔹 Encoded Binary:", encoded_binary)
+    print("🔹 Decoded Text:  ", decoded_text)
+
+    # === 壓縮比例 ===
+    original_bits = len(input_text) * 8
+    compressed_bits = len(encoded_binary)
+    print("\n📊 Compression Ratio:")
+    print(f"  Original size: {original_bits} bits")
+    print(f"  Compressed size: {compressed_bits} bits")
+    print(f"  Compression Rate: {compressed_bits / original_bits:.2%}")
+
+    # === Bit-packed 輸出與查表解碼 ===
+    packed = compress_bytes(input_text, huffman_codes)
+    print("\n📦 Packed Bytes:", packed.hex())
+    print(f"  Packed size: {len(packed) * 8} bits (含 1 byte padding 標頭)")
+    print("🔹 Table Decoded: ", decompress_bytes(packed, huffman_codes))
+
+    # === Canonical Huffman（含標頭，可獨立解碼）===
+    canonical = compress_canonical(input_text)
+    print(f"\n📦 Canonical size: {len(canonical) * 8} bits (含標頭)")
+    print("🔹 Canonical Decoded:", decompress_canonical(canonical))
+
+    # === Adaptive Huffman（單次走訪）===
+    adaptive = adaptive_compress(input_text)
+    print(f"\n📦 Adaptive size: {len(adaptive) * 8} bits")
+    print("🔹 Adaptive Decoded:", adaptive_decompress(adaptive))
 
 #--------------------------------------------------------------------------
 
@@ -136,20 +822,639 @@ def display():
     for row in grid:
         print(' '.join(['*' if cell else '0' for cell in row]))
 
-# 主執行流程
-generation = 1
-while True:
-    print(f"\n=== 第 {generation} 代 ===")
-    display()
-    user_input = input("是否繼續下一代？(y/n): ").strip().lower()
-    if user_input != 'y':
-        print("模擬結束。")
-        break
-    update()
-    generation += 1
+# ========== NumPy 向量化引擎：整張網格一次算完鄰居數 ==========
+try:
+    import numpy as np
+except ImportError:  # 沒裝 NumPy 時只能用純 Python 版本
+    np = None
+
+# 規則字串，例如 "B3/S23"：鄰居數 3 時出生，鄰居數 2 或 3 時存活
+def parse_rule(rule):
+    birth, survive = set(), set()
+    for part in rule.upper().split('/'):
+        if part[:1] not in ('B', 'S') or not all(c in '012345678' for c in part[1:]):
+            raise ValueError(f"無法辨識的規則：{rule!r}，格式應為 B<0-8 的數字>/S<0-8 的數字>，例如 B3/S23")
+        target = birth if part[0] == 'B' else survive
+        target.update(int(c) for c in part[1:])
+    return frozenset(birth), frozenset(survive)
+
+# list-of-lists 網格與 NumPy 陣列互轉
+def to_array(grid):
+    return np.array(grid, dtype=np.uint8)
+
+def to_grid(board):
+    return board.tolist()
+
+# 鄰居數屬於 counts 中任一值的格子
+def _count_in(neighbors, counts):
+    result = np.zeros(neighbors.shape, dtype=bool)
+    for n in counts:
+        result |= neighbors == n
+    return result
+
+# 用 8 個平移後的切片相加得到鄰居數，再整批套用出生 / 存活規則
+# wrap=True 時上下、左右邊界相連（環面）
+def step_numpy(board, rule="B3/S23", wrap=False):
+    birth, survive = parse_rule(rule)
+    h, w = board.shape
+    padded = np.pad(board, 1, mode='wrap' if wrap else 'constant')
+    neighbors = np.zeros((h, w), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                neighbors += padded[dy:dy + h, dx:dx + w]
+    alive = board.astype(bool)
+    # 出生與存活都成立的鄰居數不必看目前狀態（B3/S23 的 3）
+    result = _count_in(neighbors, birth & survive)
+    if birth - survive:
+        result |= ~alive & _count_in(neighbors, birth - survive)
+    if survive - birth:
+        result |= alive & _count_in(neighbors, survive - birth)
+    return result.astype(np.uint8)
+
+# ========== Bit-packed 網格：每列一個 Python int，一次運算更新整列 ==========
+class BitBoard:
+    def __init__(self, rows, cols, cells=None):
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells if cells is not None else [0] * rows  # 第 x 個 bit 代表第 x 欄
+
+    @classmethod
+    def from_grid(cls, grid):
+        cells = [int(''.join('1' if cell else '0' for cell in reversed(row)), 2) for row in grid]
+        return cls(len(grid), len(grid[0]), cells)
+
+    def to_grid(self):
+        return [[(row >> x) & 1 for x in range(self.cols)] for row in self.cells]
+
+    def population(self):
+        return sum(bin(row).count('1') for row in self.cells)
+
+    # 一列的左右鄰居（往右 / 往左平移一格）
+    def _shifted(self, row, wrap):
+        full = (1 << self.cols) - 1
+        west = (row << 1) & full       # 第 x 格看到第 x-1 格
+        east = row >> 1                # 第 x 格看到第 x+1 格
+        if wrap:
+            west |= row >> (self.cols - 1)
+            east |= (row & 1) << (self.cols - 1)
+        return west, east
+
+    # 鄰居數 (s0~s3 四個 bit) 剛好等於 count 的位置
+    @staticmethod
+    def _count_mask(bits, count, full):
+        mask = full
+        for i, bit in enumerate(bits):
+            mask &= bit if (count >> i) & 1 else ~bit
+        return mask
+
+    # 用全加器把 8 個鄰居的 bit 加成 4 bit 的鄰居數 (s0~s3)，再套用規則
+    def step(self, rule="B3/S23", wrap=False):
+        birth, survive = parse_rule(rule)
+        full = (1 << self.cols) - 1
+        n = self.rows
+        shifted = [self._shifted(row, wrap) for row in self.cells]
+        # 每列「左+中+右」的個位與 2 的位數，給上下兩列共用
+        sums = [(west ^ row ^ east, (west & row) | (west & east) | (row & east))
+                for row, (west, east) in zip(self.cells, shifted)]
+        new_cells = []
+        for y, row in enumerate(self.cells):
+            if y > 0 or wrap:
+                up0, up1 = sums[y - 1]
+            else:
+                up0 = up1 = 0
+            if y < n - 1:
+                down0, down1 = sums[y + 1]
+            elif wrap:
+                down0, down1 = sums[0]
+            else:
+                down0 = down1 = 0
+            west, east = shifted[y]
+            mid0, mid1 = west ^ east, west & east
+            # 個位：三個 bit 相加
+            s0 = up0 ^ down0 ^ mid0
+            carry = (up0 & down0) | (up0 & mid0) | (down0 & mid0)
+            # 2 的位數：up1 + down1 + mid1 + carry
+            t = up1 ^ down1 ^ mid1
+            k1 = (up1 & down1) | (up1 & mid1) | (down1 & mid1)
+            s1 = t ^ carry
+            k2 = t & carry
+            bits = (s0, s1, k1 ^ k2, k1 & k2)
+
+            result = 0
+            for count in birth & survive:
+                result |= self._count_mask(bits, count, full)
+            for count in birth - survive:
+                result |= self._count_mask(bits, count, full) & ~row
+            for count in survive - birth:
+                result |= self._count_mask(bits, count, full) & row
+            new_cells.append(result & full)
+        return BitBoard(self.rows, self.cols, new_cells)
+
+# ========== 稀疏引擎與 HashLife：只處理活細胞，適合極大且大多空白的平面 ==========
+NEIGHBOR_OFFSETS = [(-1,-1), (-1,0), (-1,1),
+                    (0,-1),         (0,1),
+                    (1,-1), (1,0), (1,1)]
+
+# 網格與活細胞座標集合 {(y, x)} 互轉
+def grid_to_cells(grid):
+    return {(y, x) for y, row in enumerate(grid) for x, cell in enumerate(row) if cell}
+
+def cells_to_grid(cells, rows, cols, top=0, left=0):
+    grid = [[0] * cols for _ in range(rows)]
+    for y, x in cells:
+        if top <= y < top + rows and left <= x < left + cols:
+            grid[y - top][x - left] = 1
+    return grid
+
+def _sparse_rule(rule):
+    birth, survive = parse_rule(rule)
+    if 0 in birth:
+        raise ValueError("B0 規則會讓無限平面上的空白處全部出生，稀疏引擎無法表示")
+    return birth, survive
+
+# 稀疏引擎：無邊界平面，每代只統計活細胞與其鄰居
+class SparseLife:
+    def __init__(self, cells=(), rule="B3/S23"):
+        self.birth, self.survive = _sparse_rule(rule)
+        self.live = set(cells)
+        self.generation = 0
+
+    def step(self):
+        counts = Counter()
+        for y, x in self.live:
+            for dy, dx in NEIGHBOR_OFFSETS:
+                counts[(y + dy, x + dx)] += 1
+        live = self.live
+        new_live = {cell for cell, n in counts.items()
+                    if (n in self.survive if cell in live else n in self.birth)}
+        if 0 in self.survive:  # 沒有鄰居的活細胞不會出現在 counts 裡
+            new_live.update(cell for cell in live if cell not in counts)
+        self.live = new_live
+        self.generation += 1
+
+    def advance(self, generations):
+        for _ in range(generations):
+            self.step()
+
+    def cells(self):
+        return set(self.live)
+
+    def population(self):
+        return len(self.live)
+
+# HashLife：四元樹節點經過正規化（相同內容只會有一個物件），
+# 因此可以用節點本身當 cache key，把「某區塊未來 2^j 代的中心」記憶起來重複使用。
+class QuadNode:
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw=None, ne=None, sw=None, se=None, population=0):
+        self.level = level            # 邊長為 2^level
+        self.nw, self.ne = nw, ne     # 左上、右上
+        self.sw, self.se = sw, se     # 左下、右下
+        self.population = population  # 活細胞數
+
+_DEAD = QuadNode(0, population=0)
+_ALIVE = QuadNode(0, population=1)
+
+# 4x4 區塊直接計算中間 2x2 的四個細胞（回傳 level 0 節點）
+def _life_4x4(node, rule):
+    birth, survive = rule
+    g = [[0] * 4 for _ in range(4)]
+    for qy, qx, quad in ((0, 0, node.nw), (0, 2, node.ne), (2, 0, node.sw), (2, 2, node.se)):
+        g[qy][qx], g[qy][qx + 1] = quad.nw.population, quad.ne.population
+        g[qy + 1][qx], g[qy + 1][qx + 1] = quad.sw.population, quad.se.population
+    result = []
+    for y, x in ((1, 1), (1, 2), (2, 1), (2, 2)):
+        n = sum(g[y + dy][x + dx] for dy, dx in NEIGHBOR_OFFSETS)
+        alive = n in survive if g[y][x] else n in birth
+        result.append(_ALIVE if alive else _DEAD)
+    return result
+
+# 正規化節點與「未來 2^j 代」的記憶表都放在 instance 上，不同模擬互不影響；
+# 節點數超過 cache_limit 時會在兩次跳躍之間整個清掉（只影響速度，不影響結果）
+class HashLife:
+    def __init__(self, cells=(), rule="B3/S23", cache_limit=None):
+        self.rule = _sparse_rule(rule)
+        self.cache_limit = cache_limit
+        self.clear_cache()
+        self.generation = 0
+        cells = list(cells)
+        if cells:
+            top = min(y for y, _ in cells)
+            left = min(x for _, x in cells)
+            size = max(max(y for y, _ in cells) - top, max(x for _, x in cells) - left) + 1
+        else:
+            top = left = 0
+            size = 1
+        level = max(3, (size - 1).bit_length())
+        self.top, self.left = top, left  # root 左上角的座標
+        self.root = self._build(level, top, left, cells)
+
+    def clear_cache(self):
+        self._nodes = {}    # (nw, ne, sw, se) → 正規化後的節點
+        self._empty = {}    # level → 全空的節點
+        self._results = {}  # (node, j) → 中心往後 2^j 代的結果
+
+    def cache_size(self):
+        return len(self._nodes) + len(self._results)
+
+    def _join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = QuadNode(nw.level + 1, nw, ne, sw, se,
+                            nw.population + ne.population + sw.population + se.population)
+            self._nodes[key] = node
+        return node
+
+    def _empty_node(self, level):
+        node = self._empty.get(level)
+        if node is None:
+            if level == 0:
+                node = _DEAD
+            else:
+                child = self._empty_node(level - 1)
+                node = self._join(child, child, child, child)
+            self._empty[level] = node
+        return node
+
+    # 外圍補一圈空白，level + 1，中心位置不變
+    def _expand(self, node):
+        e = self._empty_node(node.level - 1)
+        join = self._join
+        return join(join(e, e, e, node.nw), join(e, e, node.ne, e),
+                    join(e, node.sw, e, e), join(node.se, e, e, e))
+
+    # 取中間那一塊，level - 1，中心位置不變
+    def _inner(self, node):
+        return self._join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    # 回傳 node 中心（level - 1）往後 2^j 代的結果；j 超過 level - 2 時都算 2^(level-2) 代
+    def _successor(self, node, j):
+        if node.population == 0:
+            return node.nw
+        j = min(j, node.level - 2)  # 先夾住 j，相同結果只存一份
+        key = (node, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        join, successor = self._join, self._successor
+        if node.level == 2:
+            result = join(*_life_4x4(node, self.rule))
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # 9 個互相重疊、level - 1 的子區塊，各自先往後算
+            c1 = successor(nw, j)
+            c2 = successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+            c3 = successor(ne, j)
+            c4 = successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+            c5 = successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+            c6 = successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+            c7 = successor(sw, j)
+            c8 = successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+            c9 = successor(se, j)
+            if j < node.level - 2:
+                # 時間只走一半：直接拼出中心，不再往後算
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                # 兩段各走 2^(level-3) 代，合計 2^(level-2) 代
+                result = join(successor(join(c1, c2, c4, c5), j),
+                              successor(join(c2, c3, c5, c6), j),
+                              successor(join(c4, c5, c7, c8), j),
+                              successor(join(c5, c6, c8, c9), j))
+        self._results[key] = result
+        return result
+
+    def _build(self, level, top, left, cells):
+        if not cells:
+            return self._empty_node(level)
+        if level == 0:
+            return _ALIVE
+        half = 1 << (level - 1)
+        quads = ([], [], [], [])
+        for y, x in cells:
+            quads[(y >= top + half) * 2 + (x >= left + half)].append((y, x))
+        return self._join(self._build(level - 1, top, left, quads[0]),
+                          self._build(level - 1, top, left + half, quads[1]),
+                          self._build(level - 1, top + half, left, quads[2]),
+                          self._build(level - 1, top + half, left + half, quads[3]))
+
+    def _grow(self):
+        offset = 1 << (self.root.level - 1)
+        self.root = self._expand(self.root)
+        self.top -= offset
+        self.left -= offset
+
+    def _shrink(self):
+        offset = 1 << (self.root.level - 2)
+        self.root = self._inner(self.root)
+        self.top += offset
+        self.left += offset
+
+    # 往後算 generations 代：依二進位拆成數次 2^j 代的跳躍
+    def advance(self, generations):
+        j = 0
+        remaining = generations
+        while remaining:
+            if remaining & 1:
+                if self.cache_limit is not None and self.cache_size() > self.cache_limit:
+                    self.clear_cache()
+                # 圖形縮在中間 1/4 內，且 2^j 不超過邊長的 1/8，擴散時不會超出結果範圍
+                self._grow()
+                self._grow()
+                while self.root.level < j + 3:
+                    self._grow()
+                offset = 1 << (self.root.level - 2)
+                self.root = self._successor(self.root, j)
+                self.top += offset
+                self.left += offset
+            remaining >>= 1
+            j += 1
+        # 把外圍多餘的空白剪掉
+        while self.root.level > 3 and self._inner(self.root).population == self.root.population:
+            self._shrink()
+        self.generation += generations
+
+    def step(self):
+        self.advance(1)
+
+    def cells(self):
+        result = set()
+        stack = [(self.root, self.top, self.left)]
+        while stack:
+            node, top, left = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                result.add((top, left))
+                continue
+            half = 1 << (node.level - 1)
+            stack.append((node.nw, top, left))
+            stack.append((node.ne, top, left + half))
+            stack.append((node.sw, top + half, left))
+            stack.append((node.se, top + half, left + half))
+        return result
+
+    def population(self):
+        return self.root.population
+
+# ========== 多行程分塊：網格放在 shared memory，每個 worker 負責一段橫向區塊 ==========
+# 兩份網格輪流當「這一代 / 下一代」，worker 直接讀相鄰區塊的上下各一列 (halo)，
+# 每代結束用 Barrier 同步，確定所有區塊都寫完才開始下一代。
+# 注意：worker 以 spawn 啟動時會重新執行本檔的頂層程式，請在 fork 平台或 __main__ 保護下使用。
+import os
+from multiprocessing import Barrier, Process, shared_memory
+from threading import BrokenBarrierError
+
+def _tile_worker(names, shape, start, stop, generations, rule, wrap, barrier):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    boards = []
+    try:
+        boards = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in buffers]
+        h = shape[0]
+        if wrap:
+            rows = [(y - 1) % h for y in range(start, stop + 2)]  # 含上下 halo
+            top = 1
+        else:
+            rows = slice(max(start - 1, 0), min(stop + 1, h))
+            top = 1 if start > 0 else 0
+        for generation in range(generations):
+            src, dst = boards[generation % 2], boards[(generation + 1) % 2]
+            # 左右 wrap 交給 step_numpy；上下靠 halo 列，halo 列自己的結果不採用
+            result = step_numpy(src[rows], rule, wrap)
+            dst[start:stop] = result[top:top + stop - start]
+            barrier.wait()
+    except BrokenBarrierError:
+        pass
+    except BaseException:
+        barrier.abort()  # 讓其他 worker 不要永遠卡在 barrier
+        raise
+    finally:
+        del boards
+        for shm in buffers:
+            shm.close()
+
+# 平行往後算 generations 代，回傳新的 NumPy 網格
+def step_parallel(board, generations, rule="B3/S23", wrap=False, workers=None):
+    if np is None:
+        raise ImportError("平行模式需要安裝 NumPy")
+    h = board.shape[0]
+    workers = max(1, min(workers or os.cpu_count() or 1, h))
+    buffers = [shared_memory.SharedMemory(create=True, size=max(board.nbytes, 1)) for _ in range(2)]
+    try:
+        boards = [np.ndarray(board.shape, dtype=np.uint8, buffer=shm.buf) for shm in buffers]
+        boards[0][:] = board
+        bounds = [h * i // workers for i in range(workers + 1)]
+        barrier = Barrier(workers)
+        names = [shm.name for shm in buffers]
+        processes = [Process(target=_tile_worker,
+                             args=(names, board.shape, bounds[i], bounds[i + 1], generations, rule, wrap, barrier))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("平行運算的 worker 執行失敗")
+        result = boards[generations % 2].copy()
+        del boards
+        return result
+    finally:
+        for shm in buffers:
+            shm.close()
+            shm.unlink()
+
+# ========== 增量繪製：只輸出和上一代不同的格子 ==========
+# 第一次畫整張網格，之後只用 ANSI 游標移動改寫有變化的格子；
+# 網格比 viewport 大時先縮小取樣（區塊內有活細胞就顯示 '*'）。
+class DiffRenderer:
+    def __init__(self, out=None, viewport=None, alive='*', dead='0'):
+        self.out = out or sys.stdout
+        self.viewport = viewport  # (列數, 欄數)，None 表示不縮放
+        self.alive = alive
+        self.dead = dead
+        self.previous = None
+
+    # 縮小取樣成 viewport 大小的 list-of-lists
+    def _frame(self, grid):
+        if self.viewport is None:
+            return grid.tolist() if np is not None and isinstance(grid, np.ndarray) else grid
+        view_rows, view_cols = self.viewport
+        h, w = len(grid), len(grid[0])
+        block_y, block_x = -(-h // view_rows), -(-w // view_cols)  # 向上取整
+        if np is not None and isinstance(grid, np.ndarray):
+            padded = np.zeros((-(-h // block_y) * block_y, -(-w // block_x) * block_x), dtype=np.uint8)
+            padded[:h, :w] = grid
+            blocks = padded.reshape(padded.shape[0] // block_y, block_y, padded.shape[1] // block_x, block_x)
+            return blocks.max(axis=(1, 3)).tolist()
+        return [[1 if any(any(row[x:x + block_x]) for row in grid[y:y + block_y]) else 0
+                 for x in range(0, w, block_x)]
+                for y in range(0, h, block_y)]
+
+    # 和上一代比較，回傳變化的格子 [(y, x, 新狀態), ...]（可當作精簡的差異紀錄）
+    def changes(self, grid):
+        frame = self._frame(grid)
+        previous = self.previous
+        self.previous = [row[:] for row in frame]
+        if previous is None or len(previous) != len(frame) or len(previous[0]) != len(frame[0]):
+            return [(y, x, cell) for y, row in enumerate(frame) for x, cell in enumerate(row)]
+        result = []
+        for y, (row, old_row) in enumerate(zip(frame, previous)):
+            if row != old_row:  # 整列相同就直接跳過
+                result.extend((y, x, cell) for x, (cell, old) in enumerate(zip(row, old_row)) if cell != old)
+        return result
+
+    # 畫出這一代，回傳改寫的格子數
+    def render(self, grid, generation=None):
+        first = self.previous is None
+        delta = self.changes(grid)
+        parts = []
+        if first:
+            parts.append('\x1b[2J')  # 清除畫面
+        if generation is not None:
+            parts.append(f'\x1b[1;1H=== 第 {generation} 代 ===\x1b[K')
+        # 同一列連續變化的格子合併成一次游標移動
+        i = 0
+        while i < len(delta):
+            y, x, _ = delta[i]
+            j = i + 1
+            while j < len(delta) and delta[j][0] == y and delta[j][1] == delta[j - 1][1] + 1:
+                j += 1
+            cells = ' '.join(self.alive if cell else self.dead for _, _, cell in delta[i:j])
+            parts.append(f'\x1b[{y + 2};{2 * x + 1}H{cells}')
+            i = j
+        parts.append(f'\x1b[{len(self.previous) + 2};1H')  # 游標移到網格下方
+        self.out.write(''.join(parts))
+        self.out.flush()
+        return len(delta)
+
+# ========== 非互動模式與效能測試 ==========
+import random
+import time
+
+LIFE_ENGINES = ("python", "numpy", "bitboard", "sparse", "hashlife", "parallel")
+
+# 純 Python 版本的一代更新（與 update() 相同邏輯，但不依賴全域變數）
+def step_grid(grid, rule="B3/S23", wrap=False):
+    birth, survive = parse_rule(rule)
+    h, w = len(grid), len(grid[0])
+    new_grid = [[0] * w for _ in range(h)]
+    for y in range(h):
+        for x in range(w):
+            neighbors = 0
+            for dy, dx in NEIGHBOR_OFFSETS:
+                ny, nx = y + dy, x + dx
+                if wrap:
+                    neighbors += grid[ny % h][nx % w]
+                elif 0 <= ny < h and 0 <= nx < w:
+                    neighbors += grid[ny][nx]
+            if neighbors in (survive if grid[y][x] else birth):
+                new_grid[y][x] = 1
+    return new_grid
+
+# 依引擎名稱建立模擬，回傳 (advance(n), current()) 兩個函式
+# sparse / hashlife 模擬的是無邊界平面，current() 只取出原本網格範圍
+def _make_engine(grid, rule, engine, wrap):
+    rows, cols = len(grid), len(grid[0])
+    if engine in ("sparse", "hashlife"):
+        if wrap:
+            raise ValueError(f"{engine} 引擎是無邊界平面，不支援 wrap")
+        sim = (SparseLife if engine == "sparse" else HashLife)(grid_to_cells(grid), rule)
+        return sim.advance, lambda: cells_to_grid(sim.cells(), rows, cols)
+    if engine == "python":
+        state, step, current = [row[:] for row in grid], step_grid, lambda board: board
+    elif engine == "numpy":
+        if np is None:
+            raise ImportError("numpy 引擎需要安裝 NumPy")
+        state, step, current = to_array(grid), step_numpy, to_grid
+    elif engine == "bitboard":
+        state, step, current = BitBoard.from_grid(grid), BitBoard.step, BitBoard.to_grid
+    elif engine == "parallel":
+        if np is None:
+            raise ImportError("parallel 引擎需要安裝 NumPy")
+        state = to_array(grid)
+
+        def advance_parallel(generations):
+            nonlocal state
+            if generations:
+                state = step_parallel(state, generations, rule, wrap)
+
+        return advance_parallel, lambda: to_grid(state)
+    else:
+        raise ValueError(f"未知的引擎：{engine}，可用：{', '.join(LIFE_ENGINES)}")
+
+    def advance(generations):
+        nonlocal state
+        for _ in range(generations):
+            state = step(state, rule, wrap)
+
+    return advance, lambda: current(state)
+
+# 不需要輸入的執行介面：回傳 (最後一代網格, [(第幾代, 網格), ...])
+# snapshot_every 有設定時，每隔幾代存一份快照
+def run(grid, generations, rule="B3/S23", engine="python", wrap=False, snapshot_every=None):
+    advance, current = _make_engine(grid, rule, engine, wrap)
+    snapshots = []
+    done = 0
+    while done < generations:
+        n = min(snapshot_every or generations, generations - done)
+        advance(n)
+        done += n
+        if snapshot_every:
+            snapshots.append((done, current()))
+    return current(), snapshots
+
+def random_grid(size, density, seed=None):
+    rng = random.Random(seed)
+    return [[1 if rng.random() < density else 0 for _ in range(size)] for _ in range(size)]
+
+# 各引擎在不同網格大小、密度下的速度：每秒幾代、每秒更新幾個格子
+def benchmark(sizes=(64, 128, 256), densities=(0.1, 0.3, 0.5), generations=10,
+              engines=LIFE_ENGINES, rule="B3/S23", seed=0):
+    results = []
+    print(f"{'engine':>10} {'size':>6} {'density':>8} {'gen/s':>12} {'cells/s':>14}")
+    for size in sizes:
+        for density in densities:
+            grid = random_grid(size, density, seed)
+            for engine in engines:
+                if engine in ("numpy", "parallel") and np is None:
+                    continue
+                advance, _ = _make_engine(grid, rule, engine, False)
+                start = time.perf_counter()
+                advance(generations)
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                gens_per_sec = generations / elapsed
+                cells_per_sec = gens_per_sec * size * size
+                results.append({"engine": engine, "size": size, "density": density,
+                                "gens_per_sec": gens_per_sec, "cells_per_sec": cells_per_sec})
+                print(f"{engine:>10} {size:>6} {density:>8.2f} {gens_per_sec:>12.1f} {cells_per_sec:>14.0f}")
+    return results
+
+# 主執行流程（加上 --life-benchmark 參數時只跑效能測試，跑完直接結束，後面的互動式區段都不會執行）
+if "--life-benchmark" in sys.argv:
+    benchmark()
+    sys.exit()
+# --expr-batch（運算式批次模式）要在讀 stdin 之前跳過所有互動式區段
+elif "--expr-batch" not in sys.argv:
+    generation = 1
+    while True:
+        print(f"\n=== 第 {generation} 代 ===")
+        display()
+        user_input = input("是否繼續下一代？(y/n): ").strip().lower()
+        if user_input != 'y':
+            print("模擬結束。")
+            break
+        update()
+        generation += 1
     #-------------------------------------------------------
 #student1
-    class StudentNode:
+from collections import deque
+
+class StudentNode:
+    __slots__ = ('name', 'chinese', 'math', 'english', 'left', 'right', 'height')  # 不建立 __dict__，節省記憶體
+
     def __init__(self, name, chinese, math, english):
         self.name = name
         self.chinese = chinese
@@ -157,46 +1462,435 @@ while True:
         self.english = english
         self.left = None
         self.right = None
+        self.height = 1
 
-def insert(root, node):
-    if root is None:
+SUBJECTS = ("chinese", "math", "english")
+
+# 單一科目的累計統計：總和、平方和與 0~100 分的人數分布，新增 / 刪除 / 修改時 O(1) 更新
+class ScoreStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.histogram = [0] * 101
+
+    def add(self, score):
+        self.count += 1
+        self.total += score
+        self.total_sq += score * score
+        self.histogram[score] += 1
+
+    def remove(self, score):
+        self.count -= 1
+        self.total -= score
+        self.total_sq -= score * score
+        self.histogram[score] -= 1
+
+    def average(self):
+        return self.total / self.count if self.count else None
+
+    def variance(self):
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        return self.total_sq / self.count - mean * mean
+
+    def min(self):
+        return next((score for score in range(101) if self.histogram[score]), None)
+
+    def max(self):
+        return next((score for score in range(100, -1, -1) if self.histogram[score]), None)
+
+# 以姓名為 key 的 AVL 樹：插入、搜尋、刪除都用迴圈完成，不會遞迴過深，高度維持 O(log n)
+class StudentTree:
+    # 後面的成績樹區段會再定義一個同名的 StudentNode，這裡先綁定，之後呼叫時才不會拿到別的類別
+    node_class = StudentNode
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+        self.stats = {subject: ScoreStats() for subject in SUBJECTS}
+
+    def _add_scores(self, node):
+        for subject in SUBJECTS:
+            self.stats[subject].add(getattr(node, subject))
+
+    def _remove_scores(self, node):
+        for subject in SUBJECTS:
+            self.stats[subject].remove(getattr(node, subject))
+
+    def __len__(self):
+        return self.size
+
+    # 依姓名順序走訪所有節點（用 stack 迭代，lazy 產生）
+    def iter_inorder(self):
+        stack = []
+        current = self.root
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            yield current
+            current = current.right
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    # 前序走訪：根 → 左 → 右
+    def iter_preorder(self):
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.right:
+                stack.append(node.right)
+            if node.left:
+                stack.append(node.left)
+
+    # 逐層走訪
+    def iter_level_order(self):
+        queue = deque([self.root] if self.root else [])
+        while queue:
+            node = queue.popleft()
+            yield node
+            if node.left:
+                queue.append(node.left)
+            if node.right:
+                queue.append(node.right)
+
+    # 依序產生姓名介於 low 與 high（含）之間的學生，只走需要的子樹
+    def iter_range(self, low, high):
+        stack = []
+        current = self.root
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left if current.name >= low else None
+            node = stack.pop()
+            if node.name > high:
+                return
+            if node.name >= low:
+                yield node
+            current = node.right
+
+    # 由已依姓名排序、不重複的 (姓名, 國文, 數學, 英文) 直接建出平衡的樹，O(n)，不必逐筆插入
+    @classmethod
+    def from_sorted(cls, records):
+        tree = cls()
+        nodes = [cls.node_class(*record) for record in records]
+
+        def build(lo, hi):  # 遞迴深度只有 log n
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.left = build(lo, mid)
+            node.right = build(mid + 1, hi)
+            tree._update_height(node)
+            return node
+
+        tree.root = build(0, len(nodes))
+        tree.size = len(nodes)
+        for node in nodes:
+            tree._add_scores(node)
+        return tree
+
+    # 任意順序的資料：排序一次（已排序時 O(n) 檢查即可）後直接建樹
+    @classmethod
+    def bulk_load(cls, records):
+        return cls.from_sorted(_sorted_unique(list(records)))
+
+    # 一次加入大量資料：與現有資料依序合併後重建，O(n + m log m)；同名以新資料為準
+    def merge(self, records):
+        existing = [(node.name, node.chinese, node.math, node.english) for node in self]
+        merged = StudentTree.from_sorted(_sorted_unique(existing + _sorted_unique(list(records))))
+        self.root, self.size, self.stats = merged.root, merged.size, merged.stats
+
+    @staticmethod
+    def _height(node):
+        return node.height if node else 0
+
+    def _update_height(self, node):
+        node.height = max(self._height(node.left), self._height(node.right)) + 1
+
+    def _rotate_right(self, y):
+        x = y.left
+        y.left, x.right = x.right, y
+        self._update_height(y)
+        self._update_height(x)
+        return x
+
+    def _rotate_left(self, x):
+        y = x.right
+        x.right, y.left = y.left, x
+        self._update_height(x)
+        self._update_height(y)
+        return y
+
+    # 更新高度並處理 LL / LR / RR / RL 四種失衡，回傳子樹新的根
+    def _rebalance(self, node):
+        self._update_height(node)
+        balance = self._height(node.left) - self._height(node.right)
+        if balance > 1:
+            if self._height(node.left.left) < self._height(node.left.right):
+                node.left = self._rotate_left(node.left)
+            return self._rotate_right(node)
+        if balance < -1:
+            if self._height(node.right.right) < self._height(node.right.left):
+                node.right = self._rotate_right(node.right)
+            return self._rotate_left(node)
         return node
-    if node.name < root.name:
-        root.left = insert(root.left, node)
-    else:
-        root.right = insert(root.right, node)
-    return root
 
-def search(root, name):
-    if root is None or root.name == name:
-        return root
-    if name < root.name:
-        return search(root.left, name)
-    else:
-        return search(root.right, name)
+    # 沿著從根走下來的路徑由下往上重新平衡，並把新的子樹根接回父節點
+    def _rebalance_path(self, path):
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            new_node = self._rebalance(node)
+            if new_node is not node:
+                if i == 0:
+                    self.root = new_node
+                elif path[i - 1].left is node:
+                    path[i - 1].left = new_node
+                else:
+                    path[i - 1].right = new_node
+
+    # 插入學生；同名時直接更新成績
+    def insert(self, node):
+        path = []
+        current = self.root
+        while current:
+            if node.name == current.name:
+                self.update_scores(current, node.chinese, node.math, node.english)
+                return current
+            path.append(current)
+            current = current.left if node.name < current.name else current.right
+        node.left = node.right = None
+        node.height = 1
+        if not path:
+            self.root = node
+        elif node.name < path[-1].name:
+            path[-1].left = node
+        else:
+            path[-1].right = node
+        self.size += 1
+        self._add_scores(node)
+        self._rebalance_path(path)
+        return node
 
-def inorder(root):
-    if root is not None:
-        inorder(root.left)
-        print(f"姓名: {root.name}, 國文: {root.chinese}, 數學: {root.math}, 英文: {root.english}")
-        inorder(root.right)
+    # 修改成績時同步更新統計
+    def update_scores(self, student, chinese, math, english):
+        self._remove_scores(student)
+        student.chinese, student.math, student.english = chinese, math, english
+        self._add_scores(student)
 
-def calc_avg(root):
-    result = []
-    def dfs(node):
-        if node:
-            dfs(node.left)
-            result.append((node.chinese, node.math, node.english))
-            dfs(node.right)
-    dfs(root)
-    if not result:
+    def search(self, name):
+        current = self.root
+        while current and current.name != name:
+            current = current.left if name < current.name else current.right
+        return current
+
+    # 刪除學生，回傳被刪除的資料（找不到時回傳 None）
+    def delete(self, name):
+        path = []
+        current = self.root
+        while current and current.name != name:
+            path.append(current)
+            current = current.left if name < current.name else current.right
+        if current is None:
+            return None
+        removed = self.node_class(current.name, current.chinese, current.math, current.english)
+        self._remove_scores(removed)
+        if current.left and current.right:
+            # 左右子樹都在，找右子樹最小者替代，改成刪除那個節點
+            path.append(current)
+            successor = current.right
+            while successor.left:
+                path.append(successor)
+                successor = successor.left
+            current.name = successor.name
+            current.chinese = successor.chinese
+            current.math = successor.math
+            current.english = successor.english
+            current = successor
+        child = current.left or current.right
+        if not path:
+            self.root = child
+        elif path[-1].left is current:
+            path[-1].left = child
+        else:
+            path[-1].right = child
+        self.size -= 1
+        self._rebalance_path(path)
+        return removed
+
+def inorder(tree):
+    for node in tree:
+        print(f"姓名: {node.name}, 國文: {node.chinese}, 數學: {node.math}, 英文: {node.english}")
+
+# 直接讀取樹上維護的累計統計，O(1)
+def calc_avg(tree):
+    if not len(tree):
         print("沒有學生資料")
         return
-    total = [sum(x) for x in zip(*result)]
-    count = len(result)
-    print(f"全班國文平均: {total[0]/count:.1f}")
-    print(f"全班數學平均: {total[1]/count:.1f}")
-    print(f"全班英文平均: {total[2]/count:.1f}")
+    print(f"全班國文平均: {tree.stats['chinese'].average():.1f}")
+    print(f"全班數學平均: {tree.stats['math'].average():.1f}")
+    print(f"全班英文平均: {tree.stats['english'].average():.1f}")
+
+# ========== 永久儲存：SQLite（以姓名為主鍵索引），啟動時依序讀出直接建樹 ==========
+import csv
+import sqlite3
+
+# 依姓名排序並去除重複（同名保留最後一筆）；已排序的資料只需 O(n) 檢查
+def _sorted_unique(records):
+    if any(records[i][0] > records[i + 1][0] for i in range(len(records) - 1)):
+        records = sorted(records, key=lambda record: record[0])
+    result = []
+    for record in records:
+        if result and result[-1][0] == record[0]:
+            result[-1] = record
+        else:
+            result.append(record)
+    return result
+
+class StudentStore:
+    def __init__(self, path="students.db"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS students ("
+                          "name TEXT PRIMARY KEY, chinese INTEGER, math INTEGER, english INTEGER"
+                          ") WITHOUT ROWID")
+
+    # 依主鍵順序讀出全部資料，直接建成平衡樹
+    def load(self):
+        rows = self.conn.execute("SELECT name, chinese, math, english FROM students ORDER BY name")
+        return StudentTree.from_sorted(rows.fetchall())
+
+    # 讀成欄式儲存，適合大量資料的統計
+    def load_columns(self):
+        rows = self.conn.execute("SELECT name, chinese, math, english FROM students ORDER BY name")
+        return StudentColumns.from_sorted(rows)
+
+    def save(self, student):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?)",
+                              (student.name, student.chinese, student.math, student.english))
+
+    def save_many(self, records):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?)", records)
+
+    def delete(self, name):
+        with self.conn:
+            self.conn.execute("DELETE FROM students WHERE name = ?", (name,))
+
+    def close(self):
+        self.conn.close()
+
+# ========== 欄式儲存：成績放在 array('B')，姓名放在 intern 過的 list ==========
+# 每位學生只佔 3 byte 成績加一個姓名參考；依姓名排序後用二分搜尋查詢（隱含的平衡樹，不需存連結），
+# 班平均等統計直接對整個欄位做運算。
+from array import array
+from bisect import bisect_left
+
+class StudentColumns:
+    def __init__(self):
+        self.names = []
+        self.columns = {subject: array('B') for subject in SUBJECTS}
+
+    def __len__(self):
+        return len(self.names)
+
+    # 由已依姓名排序、不重複的 (姓名, 國文, 數學, 英文) 建立
+    @classmethod
+    def from_sorted(cls, records):
+        table = cls()
+        for name, *scores in records:
+            table.names.append(sys.intern(name))
+            for subject, score in zip(SUBJECTS, scores):
+                table.columns[subject].append(score)
+        return table
+
+    @classmethod
+    def from_tree(cls, tree):
+        return cls.from_sorted((node.name, node.chinese, node.math, node.english) for node in tree)
+
+    def to_tree(self):
+        return StudentTree.from_sorted(zip(self.names, *(self.columns[subject] for subject in SUBJECTS)))
+
+    def _index(self, name):
+        index = bisect_left(self.names, name)
+        return index, index < len(self.names) and self.names[index] == name
+
+    def search(self, name):
+        index, found = self._index(name)
+        if not found:
+            return None
+        return (self.names[index], *(self.columns[subject][index] for subject in SUBJECTS))
+
+    # 新增學生；同名時更新成績
+    def insert(self, name, chinese, math, english):
+        index, found = self._index(name)
+        scores = (chinese, math, english)
+        if found:
+            for subject, score in zip(SUBJECTS, scores):
+                self.columns[subject][index] = score
+            return
+        self.names.insert(index, sys.intern(name))
+        for subject, score in zip(SUBJECTS, scores):
+            self.columns[subject].insert(index, score)
+
+    def delete(self, name):
+        index, found = self._index(name)
+        if not found:
+            return False
+        del self.names[index]
+        for column in self.columns.values():
+            del column[index]
+        return True
+
+    # 單一科目的整欄統計：平均、最低、最高、變異數
+    def column_stats(self, subject):
+        column = self.columns[subject]
+        if not column:
+            return None
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.uint8)
+            return {"average": float(values.mean()), "min": int(values.min()),
+                    "max": int(values.max()), "variance": float(values.var())}
+        mean = sum(column) / len(column)
+        return {"average": mean, "min": min(column), "max": max(column),
+                "variance": sum(score * score for score in column) / len(column) - mean * mean}
+
+    def averages(self):
+        return {subject: self.column_stats(subject)["average"] for subject in SUBJECTS} if self.names else None
+
+# 讀取 CSV：每列「姓名,國文,數學,英文」，第一列若不是數字則視為標題
+def read_students_csv(path):
+    records = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for line_no, row in enumerate(csv.reader(f), 1):
+            if not row:
+                continue
+            if len(row) != 4:
+                raise ValueError(f"第 {line_no} 列欄位數應為 4")
+            name, *scores = (field.strip() for field in row)
+            try:
+                scores = [int(score) for score in scores]
+            except ValueError:
+                if line_no == 1:
+                    continue  # 標題列
+                raise ValueError(f"第 {line_no} 列成績不是整數")
+            if not all(0 <= score <= 100 for score in scores):
+                raise ValueError(f"第 {line_no} 列成績必須在 0 到 100 之間")
+            records.append((name, *scores))
+    return records
+
+# 匯入 CSV：與目前資料合併後一次重建平衡樹，並整批寫入資料庫，回傳 (樹, 匯入筆數)
+def import_csv(tree, store, path):
+    imported = _sorted_unique(read_students_csv(path))
+    store.save_many(imported)
+    tree.merge(imported)
+    return tree, len(imported)
 
 def get_int_input(prompt):
     while True:
@@ -210,103 +1904,149 @@ def get_int_input(prompt):
         except ValueError:
             print("請輸入正確的數字！")
 
-def delete(root, name):
-    if root is None:
-        return root
-    if name < root.name:
-        root.left = delete(root.left, name)
-    elif name > root.name:
-        root.right = delete(root.right, name)
-    else:
-        # 找到要刪除的節點
-        if root.left is None:
-            return root.right
-        elif root.right is None:
-            return root.left
-        # 左右子樹都在，找右子樹最小者替代
-        min_larger_node = root.right
-        while min_larger_node.left:
-            min_larger_node = min_larger_node.left
-        # 複製資料
-        root.name = min_larger_node.name
-        root.chinese = min_larger_node.chinese
-        root.math = min_larger_node.math
-        root.english = min_larger_node.english
-        # 刪除右子樹的最小節點
-        root.right = delete(root.right, min_larger_node.name)
-    return root
-
+# --expr-batch（運算式批次模式）時不進入選單
+if "--expr-batch" not in sys.argv:
+    store = StudentStore()
+    roster = store.load()  # 直接從排序好的資料建樹，不必重播插入
 
-root = None
-
-while True:
-    print("\n1.輸入 2.修改 3.學生成績 4.班平均 5.刪除學生 6.離開")
-    choice = input("請輸入選項: ")
-    if choice == "1":
-        name = input("請輸入名字: ")
-        chinese = get_int_input("請輸入國文成績: ")
-        math = get_int_input("請輸入數學成績: ")
-        english = get_int_input("請輸入英文成績: ")
-        node = StudentNode(name, chinese, math, english)
-        root = insert(root, node)
-    elif choice == "2":
-        if root is None:
-            print("目前沒有學生資料，請先輸入。")
-            continue
-        name = input("請輸入要修改的學生名字: ")
-        student = search(root, name)
-        if student:
+    while True:
+        print("\n1.輸入 2.修改 3.學生成績 4.班平均 5.刪除學生 6.離開 7.匯入CSV")
+        choice = input("請輸入選項: ")
+        if choice == "1":
+            name = input("請輸入名字: ")
             chinese = get_int_input("請輸入國文成績: ")
             math = get_int_input("請輸入數學成績: ")
             english = get_int_input("請輸入英文成績: ")
-            student.chinese = chinese
-            student.math = math
-            student.english = english
-            print("修改完成")
-        else:
-            print("查無此人")
-    elif choice == "3":
-        if root is None:
-            print("目前沒有學生資料，請先輸入。")
-            continue
-        inorder(root)
-    elif choice == "4":
-        if root is None:
-            print("目前沒有學生資料，請先輸入。")
-            continue
-        calc_avg(root)
-    elif choice == "5":
-        if root is None:
-            print("目前沒有學生資料，請先輸入。")
-            continue
-        name = input("請輸入要刪除的學生名字: ")
-        if search(root, name):
-            root = delete(root, name)
-            print("已刪除", name)
+            node = StudentNode(name, chinese, math, english)
+            store.save(roster.insert(node))
+        elif choice == "2":
+            if roster.root is None:
+                print("目前沒有學生資料，請先輸入。")
+                continue
+            name = input("請輸入要修改的學生名字: ")
+            student = roster.search(name)
+            if student:
+                chinese = get_int_input("請輸入國文成績: ")
+                math = get_int_input("請輸入數學成績: ")
+                english = get_int_input("請輸入英文成績: ")
+                roster.update_scores(student, chinese, math, english)
+                store.save(student)
+                print("修改完成")
+            else:
+                print("查無此人")
+        elif choice == "3":
+            if roster.root is None:
+                print("目前沒有學生資料，請先輸入。")
+                continue
+            inorder(roster)
+        elif choice == "4":
+            if roster.root is None:
+                print("目前沒有學生資料，請先輸入。")
+                continue
+            calc_avg(roster)
+        elif choice == "5":
+            if roster.root is None:
+                print("目前沒有學生資料，請先輸入。")
+                continue
+            name = input("請輸入要刪除的學生名字: ")
+            if roster.delete(name):
+                store.delete(name)
+                print("已刪除", name)
+            else:
+                print("查無此人")
+        elif choice == "6":
+            store.close()
+            print("再見！")
+            break
+        elif choice == "7":
+            path = input("請輸入 CSV 檔案路徑: ")
+            try:
+                roster, count = import_csv(roster, store, path)
+                print(f"已匯入 {count} 筆資料")
+            except (OSError, ValueError) as e:
+                print("匯入失敗:", e)
         else:
-            print("查無此人")
-    elif choice == "6":
-        print("再見！")
-        break
-    else:
-        print("無效選項，請重新輸入")
+            print("無效選項，請重新輸入")
 #-------------------------------------------------------
-
 class StudentNode:
     def __init__(self, student_id, score):
         self.id = student_id
         self.score = score
         self.left = None
         self.right = None
+        self.size = 1    # Number of nodes in this subtree (for rank queries)
+        self.height = 1  # AVL height, keeps the tree O(log n) deep
+
+def size(node):
+    return node.size if node else 0
+
+# ----------------------------
+# AVL balancing (iterative, sizes are recomputed through every rotation)
+# ----------------------------
+def _score_height(node):
+    return node.height if node else 0
+
+def _score_update(node):
+    node.height = max(_score_height(node.left), _score_height(node.right)) + 1
+    node.size = size(node.left) + size(node.right) + 1
+
+def _score_rotate_right(y):
+    x = y.left
+    y.left, x.right = x.right, y
+    _score_update(y)
+    _score_update(x)
+    return x
+
+def _score_rotate_left(x):
+    y = x.right
+    x.right, y.left = y.left, x
+    _score_update(x)
+    _score_update(y)
+    return y
+
+def _score_rebalance(node):
+    _score_update(node)
+    balance = _score_height(node.left) - _score_height(node.right)
+    if balance > 1:
+        if _score_height(node.left.left) < _score_height(node.left.right):
+            node.left = _score_rotate_left(node.left)
+        return _score_rotate_right(node)
+    if balance < -1:
+        if _score_height(node.right.right) < _score_height(node.right.left):
+            node.right = _score_rotate_right(node.right)
+        return _score_rotate_left(node)
+    return node
+
+def _score_rebalance_path(root, path):
+    """Rebalance the nodes on a root-to-leaf path bottom-up and return the new root."""
+    for i in range(len(path) - 1, -1, -1):
+        node = path[i]
+        new_node = _score_rebalance(node)
+        if new_node is not node:
+            if i == 0:
+                root = new_node
+            elif path[i - 1].left is node:
+                path[i - 1].left = new_node
+            else:
+                path[i - 1].right = new_node
+    return root
 
+# Nodes are ordered by (score, id), so students with the same score all stay reachable
 def insert(root, student_id, score):
-    if root is None:
-        return StudentNode(student_id, score)
-    if score < root.score:
-        root.left = insert(root.left, student_id, score)
+    key = (score, student_id)
+    path = []
+    current = root
+    while current:
+        path.append(current)
+        current = current.left if key < (current.score, current.id) else current.right
+    node = StudentNode(student_id, score)
+    if not path:
+        return node
+    if key < (path[-1].score, path[-1].id):
+        path[-1].left = node
     else:
-        root.right = insert(root.right, student_id, score)
-    return root
+        path[-1].right = node
+    return _score_rebalance_path(root, path)
 
 def search(root, score):
     if root is None:
@@ -318,46 +2058,190 @@ def search(root, score):
     else:
         return search(root.right, score)
 
+def find_exact(root, student_id, score):
+    current = root
+    while current is not None and (current.score, current.id) != (score, student_id):
+        current = current.left if (score, student_id) < (current.score, current.id) else current.right
+    return current
+
 def find_min(node):
     current = node
     while current.left is not None:
         current = current.left
     return current
 
-def delete(root, score):
-    if root is None:
-        return None
-    if score < root.score:
-        root.left = delete(root.left, score)
-    elif score > root.score:
-        root.right = delete(root.right, score)
+def _delete_key(root, student_id, score):
+    key = (score, student_id)
+    path = []
+    current = root
+    while current and (current.score, current.id) != key:
+        path.append(current)
+        current = current.left if key < (current.score, current.id) else current.right
+    if current is None:
+        return root
+    # Two children: copy the in-order successor here and unlink the successor instead
+    if current.left and current.right:
+        path.append(current)
+        successor = current.right
+        while successor.left:
+            path.append(successor)
+            successor = successor.left
+        current.score = successor.score
+        current.id = successor.id
+        current = successor
+    child = current.left or current.right
+    if not path:
+        return child
+    if path[-1].left is current:
+        path[-1].left = child
     else:
-        # Case 1: No child
-        if root.left is None and root.right is None:
-            return None
-        # Case 2: One child
-        elif root.left is None:
-            return root.right
-        elif root.right is None:
-            return root.left
-        # Case 3: Two children
-        else:
-            min_larger_node = find_min(root.right)
-            root.score = min_larger_node.score
-            root.id = min_larger_node.id
-            root.right = delete(root.right, min_larger_node.score)
-    return root
+        path[-1].right = child
+    return _score_rebalance_path(root, path)
+
+def delete(root, score, student_id=None):
+    """
+    Delete one student with the given score.
+    Pass student_id to pick a specific student when several share the score.
+    """
+    if student_id is None:
+        target = search(root, score)
+    else:
+        target = find_exact(root, student_id, score)
+    if target is None:
+        return root
+    return _delete_key(root, target.id, target.score)
+
+# ----------------------------
+# Lazy, iterative traversals (no recursion, nothing is built up front)
+# ----------------------------
+def score_iter_inorder(root):
+    stack = []
+    current = root
+    while stack or current:
+        while current:
+            stack.append(current)
+            current = current.left
+        current = stack.pop()
+        yield current
+        current = current.right
+
+def score_iter_preorder(root):
+    stack = [root] if root else []
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.right:
+            stack.append(node.right)
+        if node.left:
+            stack.append(node.left)
+
+def score_iter_level_order(root):
+    queue = deque([root] if root else [])
+    while queue:
+        node = queue.popleft()
+        yield node
+        if node.left:
+            queue.append(node.left)
+        if node.right:
+            queue.append(node.right)
+
+def score_iter_range(root, low, high):
+    """Yield students with low <= score <= high in score order, skipping subtrees outside the range."""
+    stack = []
+    current = root
+    while stack or current:
+        while current:
+            stack.append(current)
+            current = current.left if current.score >= low else None
+        node = stack.pop()
+        if node.score > high:
+            return
+        if node.score >= low:
+            yield node
+        current = node.right
 
 def inorder_traversal(root):
-    if root:
-        inorder_traversal(root.left)
-        print(f"ID: {root.id}, Score: {root.score}")
-        inorder_traversal(root.right)
+    for node in score_iter_inorder(root):
+        print(f"ID: {node.id}, Score: {node.score}")
 
 # ----------------------------
-# Example usage
+# Bulk construction
 # ----------------------------
-if __name__ == "__main__":
+def _score_build_balanced(items, lo, hi):
+    # Middle item becomes the root; recursion depth is only log n
+    if lo >= hi:
+        return None
+    mid = (lo + hi) // 2
+    node = StudentNode(*items[mid])
+    node.left = _score_build_balanced(items, lo, mid)
+    node.right = _score_build_balanced(items, mid + 1, hi)
+    _score_update(node)
+    return node
+
+def score_bulk_load(records):
+    """
+    Build a perfectly balanced tree from (student_id, score) pairs.
+    One sort, then O(n) construction; sorted() only needs a linear pass on already-sorted input.
+    """
+    items = sorted(records, key=lambda record: (record[1], record[0]))
+    return _score_build_balanced(items, 0, len(items))
+
+def score_merge(root, records):
+    """Insert a batch by merging it with the existing in-order run and rebuilding: O(n + m log m)."""
+    existing = [(node.id, node.score) for node in score_iter_inorder(root)]
+    return score_bulk_load(existing + list(records))
+
+# ----------------------------
+# Order-statistics queries (use subtree sizes, O(log n) or O(log n + k))
+# ----------------------------
+def range_query(root, low, high):
+    """All students with low <= score <= high, in score order."""
+    return list(score_iter_range(root, low, high))
+
+def kth_smallest(root, k):
+    """The k-th lowest score (1-based), or None if k is out of range."""
+    if not 1 <= k <= size(root):
+        return None
+    current = root
+    while True:
+        left_size = size(current.left)
+        if k <= left_size:
+            current = current.left
+        elif k == left_size + 1:
+            return current
+        else:
+            k -= left_size + 1
+            current = current.right
+
+def kth_best(root, k):
+    """The k-th highest score (1-based)."""
+    return kth_smallest(root, size(root) - k + 1) if 1 <= k <= size(root) else None
+
+def count_below(root, score, inclusive=False):
+    """Number of students scoring below score (or at most score when inclusive)."""
+    count = 0
+    current = root
+    while current:
+        if current.score < score or (inclusive and current.score == score):
+            count += size(current.left) + 1
+            current = current.right
+        else:
+            current = current.left
+    return count
+
+def percentile_rank(root, score):
+    """Percentage of students below score, counting ties as half."""
+    total = size(root)
+    if total == 0:
+        return None
+    below = count_below(root, score)
+    equal = count_below(root, score, inclusive=True) - below
+    return (below + 0.5 * equal) / total * 100
+
+# ----------------------------
+# Example usage (skipped in --expr-batch mode, which keeps stdout for results)
+# ----------------------------
+if __name__ == "__main__" and "--expr-batch" not in sys.argv:
     # Create BST and insert students
     root = None
     root = insert(root, 1001, 85)
@@ -382,46 +2266,75 @@ if __name__ == "__main__":
 
     print("BST after deletion (in-order):")
     inorder_traversal(root)
+
+    # Rank and range examples
+    root = insert(root, 1005, 89)
+    print("\nStudents scoring 80-90:", [(n.id, n.score) for n in range_query(root, 80, 90)])
+    best = kth_best(root, 1)
+    print(f"Best score: ID = {best.id}, Score = {best.score}")
+    print(f"Percentile rank of 89: {percentile_rank(root, 89):.1f}%")
     #-------------------------------------------------------
 
     # (1/1) × √1 + (1/2) × √2 + (1/3) × √3 + ... + (1/n) × √n
-# 輸入使用者要計算的項數 n
-n = int(input("請輸入要前幾項："))
-
-# 初始化總和
-total = 0
-
-# 使用 for 迴圈計算每一項並加總
-for i in range(1, n + 1):
-    term = (1 / i) * (i ** 0.5)  # (1/i) × √i
-    total += term
-
-# 輸出總和，可選擇保留 4 位小數
-print(f"總和為：{total:.4f}")
+# 每一項 (1/i) × √i 其實就是 1/√i，所以總和 = Σ 1/√i
+import math
+
+SERIES_CHUNK_SIZE = 1 << 20          # NumPy 每次只產生這麼多項，記憶體固定約 8 MB
+SERIES_ASYMPTOTIC_MIN_N = 10 ** 4    # n 超過這個值就直接用漸近公式
+ZETA_HALF = -1.4603545088095868      # ζ(1/2)
+
+def series_sum_loop(n):
+    """純 Python：逐項計算，用 math.fsum 做補償加總（不會累積捨入誤差）"""
+    return math.fsum(1 / math.sqrt(i) for i in range(1, n + 1))
+
+def series_sum_numpy(n, chunk_size=SERIES_CHUNK_SIZE):
+    """NumPy 分段向量化：每段用 np.sum（成對加總）算小計，各段小計再用 math.fsum 合併"""
+    partials = []
+    for start in range(1, n + 1, chunk_size):
+        i = np.arange(start, min(start + chunk_size, n + 1), dtype=np.float64)
+        partials.append(float(np.sum(1 / np.sqrt(i))))
+    return math.fsum(partials)
+
+def series_sum_asymptotic(n):
+    """
+    Euler–Maclaurin 展開，O(1)：
+    Σ 1/√i = 2√n + ζ(1/2) + 1/(2√n) − n^(-3/2)/24 + n^(-7/2)/384 − n^(-11/2)/1024 + R
+    這個級數的餘項正負交錯，|R| 不超過下一項：|R| ≤ 135135/154828800 · n^(-15/2) ≈ 8.8e-4 · n^(-15/2)
+    （n ≥ 10 時 < 3e-11，n ≥ 100 時已小於浮點數本身的捨入誤差）
+    """
+    if n < 1:
+        return 0.0
+    root = math.sqrt(n)
+    inv = 1 / root
+    inv2 = inv * inv
+    inv3 = inv * inv2
+    return (2 * root + ZETA_HALF + inv / 2
+            + inv3 * (-1 / 24 + inv2 * inv2 * (1 / 384 - inv2 * inv2 / 1024)))
+
+def series_error_bound(n):
+    """series_sum_asymptotic(n) 的截斷誤差上界（不含浮點捨入）"""
+    return 135135 / 154828800 * n ** -7.5
+
+def series_sum(n):
+    if n >= SERIES_ASYMPTOTIC_MIN_N:
+        return series_sum_asymptotic(n)
+    if np is not None:
+        return series_sum_numpy(n)
+    return series_sum_loop(n)
+
+# --expr-batch（運算式批次模式）時不詢問
+if "--expr-batch" not in sys.argv:
+    # 輸入使用者要計算的項數 n
+    n = int(input("請輸入要前幾項："))
+
+    # n 很大時用漸近公式，否則用向量化 / 補償加總逐項計算
+    total = series_sum(n)
+
+    # 輸出總和，可選擇保留 4 位小數
+    print(f"總和為：{total:.4f}")
 #-------------------------------------------------------
 
 
-# -*- coding: utf-8 -*-
-"""
-Program Function:
- 1. Prompt the user to enter an infix expression (e.g., 3+4*2/(1-5)**2)
- 2. Calculate and display the result of the expression
-"""
-
-# Prompt the user to input an expression
-expr = input("Please enter an infix expression (e.g., 3+4*2): ")
-
-try:
-    # Use Python's built-in eval function to compute the result
-    result = eval(expr)
-    # Display the full expression and the result
-    print(f"{expr} = {result}")
-except Exception as e:
-    # Catch any input errors and display a warning
-    print("Calculation failed. Please make sure your input is a valid arithmetic expression.")
-    print("Error message:", e)
-#-------------------------------------------------
-
 # 定義節點類別，用於儲存每個文字欄位
 class Node:
     def __init__(self, text):
@@ -514,7 +2427,8 @@ class LinkedList:
         print("================\n")
 
 
-if __name__ == "__main__":
+# --expr-batch（運算式批次模式）時不印範例
+if __name__ == "__main__" and "--expr-batch" not in sys.argv:
     # 建立文件物件
     doc = LinkedList()
 
@@ -546,55 +2460,57 @@ if __name__ == "__main__":
 #------------------------------------------
 import heapq
 
-# 1. 定義病人資料：每筆為 (姓名, 優先級, 到院順序)
-#    假設 A~I 依序到達，arr_num 分別為 1~9
-patients = [
-    ('A', 3, 1),
-    ('B', 2, 2),
-    ('C', 1, 3),
-    ('D', 3, 4),
-    ('E', 4, 5),
-    ('F', 2, 6),
-    ('G', 2, 7),
-    ('H', 3, 8),
-    ('I', 1, 9),
-]
+# --expr-batch（運算式批次模式）時不印範例
+if "--expr-batch" not in sys.argv:
+    # 1. 定義病人資料：每筆為 (姓名, 優先級, 到院順序)
+    #    假設 A~I 依序到達，arr_num 分別為 1~9
+    patients = [
+        ('A', 3, 1),
+        ('B', 2, 2),
+        ('C', 1, 3),
+        ('D', 3, 4),
+        ('E', 4, 5),
+        ('F', 2, 6),
+        ('G', 2, 7),
+        ('H', 3, 8),
+        ('I', 1, 9),
+    ]
 
-# 2. 計算優先值：value = priority * 1000 + 800 - arrival_num
-patients_with_value = []
-for name, priority, arrival in patients:
-    value = priority * 1000 + 800 - arrival
-    patients_with_value.append((name, priority, arrival, value))
-
-# 2a. 列印每位病人的計算結果
-print("病人  優先級  到院順序  計算值")
-for name, priority, arrival, value in patients_with_value:
-    print(f"{name:>2}      {priority:>2}        {arrival:>2}       {value}")
-
-# 3. 根據計算值降序排序，決定治療順序
-sorted_patients = sorted(patients_with_value, key=lambda x: x[3], reverse=True)
-print("\n── 根據優先值降序排序後的治療順序 ──")
-for idx, (name, _, _, value) in enumerate(sorted_patients, 1):
-    print(f"{idx:>2}. 病人{name} (值={value})")
-
-# 4. 建立最大堆 (Max-Heap)
-#    Python 的 heapq 預設為最小堆，因此推入時使用 -value
-heap = []
-for name, _, _, value in patients_with_value:
-    heapq.heappush(heap, (-value, name))
-
-# 4a. 列印堆的內部列表結構 (neg_value, name)
-print("\n堆的內部列表表示 (neg_value, name)：")
-print(heap)
-
-# 4b. 從最大堆中依序彈出，得到真正的優先治療順序
-print("\n── 從最大堆彈出得到的治療順序 ──")
-order = []
-while heap:
-    neg_value, name = heapq.heappop(heap)
-    order.append((name, -neg_value))
-for idx, (name, value) in enumerate(order, 1):
-    print(f"{idx:>2}. 病人{name} (值={value})")
+    # 2. 計算優先值：value = priority * 1000 + 800 - arrival_num
+    patients_with_value = []
+    for name, priority, arrival in patients:
+        value = priority * 1000 + 800 - arrival
+        patients_with_value.append((name, priority, arrival, value))
+
+    # 2a. 列印每位病人的計算結果
+    print("病人  優先級  到院順序  計算值")
+    for name, priority, arrival, value in patients_with_value:
+        print(f"{name:>2}      {priority:>2}        {arrival:>2}       {value}")
+
+    # 3. 根據計算值降序排序，決定治療順序
+    sorted_patients = sorted(patients_with_value, key=lambda x: x[3], reverse=True)
+    print("\n── 根據優先值降序排序後的治療順序 ──")
+    for idx, (name, _, _, value) in enumerate(sorted_patients, 1):
+        print(f"{idx:>2}. 病人{name} (值={value})")
+
+    # 4. 建立最大堆 (Max-Heap)
+    #    Python 的 heapq 預設為最小堆，因此推入時使用 -value
+    heap = []
+    for name, _, _, value in patients_with_value:
+        heapq.heappush(heap, (-value, name))
+
+    # 4a. 列印堆的內部列表結構 (neg_value, name)
+    print("\n堆的內部列表表示 (neg_value, name)：")
+    print(heap)
+
+    # 4b. 從最大堆中依序彈出，得到真正的優先治療順序
+    print("\n── 從最大堆彈出得到的治療順序 ──")
+    order = []
+    while heap:
+        neg_value, name = heapq.heappop(heap)
+        order.append((name, -neg_value))
+    for idx, (name, value) in enumerate(order, 1):
+        print(f"{idx:>2}. 病人{name} (值={value})")
     #---------------------------------------------
 # -*- coding: utf-8 -*-
 """
@@ -604,96 +2520,213 @@ Program Function:
  3. Calculate and display the result
 """
 
+# 一元負號在 token 中寫成 'u-'，和減法區分
+UNARY_MINUS = 'u-'
+
 # Function to define operator precedence
 def precedence(op):
     if op == '+' or op == '-':
         return 1
     if op == '*' or op == '/':
         return 2
+    if op == UNARY_MINUS:
+        return 3
+    if op == '**':
+        return 4
     return 0
 
+# 次方與一元負號是右結合（2**3**2 = 2**9）
+def is_right_associative(op):
+    return op == '**' or op == UNARY_MINUS
+
+# ========== 新增：一次掃描的 tokenizer ==========
+import re
+
+# 每次比對吃掉前面的空白，再依序嘗試：數字、變數名稱、運算子／括號；都不符合就是非法字元
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|([A-Za-z_]\w*)|(\*\*|[-+*/()])|(\S))')
+
+def tokenize(expression):
+    """
+    把中序字串切成 token list，只掃描一次。
+    一元負號會轉成 UNARY_MINUS，一元正號直接略過。
+    """
+    tokens = []
+    expects_operand = True  # 下一個 token 應該是運算元（用來判斷一元負號）
+    for number, name, op, bad in TOKEN_PATTERN.findall(expression):
+        if bad:
+            raise ValueError(f"無法辨識的字元：{bad!r}")
+        if number or name:
+            tokens.append(number or name)
+            expects_operand = False
+        elif op == ')':
+            tokens.append(op)
+            expects_operand = False
+        elif op in ('+', '-') and expects_operand:
+            if op == '-':
+                tokens.append(UNARY_MINUS)
+        elif op:
+            tokens.append(op)
+            expects_operand = True
+    return tokens
+
 # ========== 原本的：中序 (infix) → 後序 (postfix) 演算法 ==========
 def infix_to_postfix(expression):
     output = []
     stack = []
-    i = 0
-    while i < len(expression):
-        char = expression[i]
-        if char == ' ':
-            i += 1
-            continue
-        # 如果是數字或小數點，處理多位數
-        if char.isdigit() or char == '.':
-            num = []
-            # 收集連續的 digit 或 '.'（支援浮點數）
-            while i < len(expression) and (expression[i].isdigit() or expression[i] == '.'):
-                num.append(expression[i])
-                i += 1
-            output.append(''.join(num))
-            continue
+    for token in tokenize(expression):
         # 如果是 '('，直接推到 stack
-        elif char == '(':
-            stack.append(char)
+        if token == '(':
+            stack.append(token)
         # 如果是 ')'，就把 stack pop 出來直到遇到 '('
-        elif char == ')':
+        elif token == ')':
             while stack and stack[-1] != '(':
                 output.append(stack.pop())
-            # 移除那個 '('
-            if stack:
-                stack.pop()
-        # 如果是四則運算子
-        elif char in '+-*/':
-            # 如果 stack 裡頂端運算子優先度 >= 自己，就先 pop 出來丟到 output
-            while stack and stack[-1] != '(' and precedence(stack[-1]) >= precedence(char):
+            # 移除那個 '('；找不到代表右括號多了
+            if not stack:
+                raise ValueError("括號不成對：多了 ')'")
+            stack.pop()
+        # 一元負號優先度比左邊的運算子都高，直接推到 stack
+        elif token == UNARY_MINUS:
+            stack.append(token)
+        # 如果是二元運算子
+        elif token in ('+', '-', '*', '/', '**'):
+            # 如果 stack 裡頂端運算子優先度 >= 自己（右結合時要 > 自己），就先 pop 出來丟到 output
+            while stack and stack[-1] != '(' and (
+                    precedence(stack[-1]) > precedence(token)
+                    or (precedence(stack[-1]) == precedence(token) and not is_right_associative(token))):
                 output.append(stack.pop())
-            stack.append(char)
-        i += 1
+            stack.append(token)
+        # 數字或變數直接輸出
+        else:
+            output.append(token)
 
-    # 最後把 stack 裡剩下的運算子全部 pop 出來
+    # 最後把 stack 裡剩下的運算子全部 pop 出來；還剩 '(' 代表右括號不夠
     while stack:
+        if stack[-1] == '(':
+            raise ValueError("括號不成對：缺少 ')'")
         output.append(stack.pop())
     return output
 
-# ========== 新增：用後序演算法衍生前序 (prefix) 的函式 ==========
-def infix_to_prefix(expression):
-    """
-    利用「反轉後處理再反轉」技巧，把中序轉成前序：
-    1. 先把整串 expression 反轉（string reverse）
-    2. 反轉後，遇到 '(' → 換成 ')'，遇到 ')' → 換成 '('
-    3. 以反轉過後的字串去呼叫 infix_to_postfix()，得到一個暫時的後序 list
-    4. 最後把這個暫時的後序 list 逆序，變成 prefix list
-    """
-    # 1. 去除空格（不影響邏輯，但方便後續處理）
-    expr = expression.replace(' ', '')
-
-    # 2. 把字串反轉
-    rev = expr[::-1]
-    # 3. 調換括號
-    tmp = []
-    for ch in rev:
-        if ch == '(':
-            tmp.append(')')
-        elif ch == ')':
-            tmp.append('(')
+# ========== 新增：運算式樹，一次產生前序 / 中序 / 後序 ==========
+class ExprNode:
+    __slots__ = ('value', 'left', 'right')
+
+    def __init__(self, value, left=None, right=None):
+        self.value = value    # 數字、變數名稱或運算子
+        self.left = left      # 一元負號只用 left
+        self.right = right
+
+def build_tree(postfix_tokens):
+    """用後序 token 建立運算式樹，每個 token 只處理一次"""
+    stack = []
+    for token in postfix_tokens:
+        if token == UNARY_MINUS:
+            if not stack:
+                raise ValueError("負號缺少運算元")
+            stack.append(ExprNode(token, stack.pop()))
+        elif precedence(token):
+            if len(stack) < 2:
+                raise ValueError(f"運算子 {token} 缺少運算元")
+            right = stack.pop()
+            stack.append(ExprNode(token, stack.pop(), right))
         else:
-            tmp.append(ch)
-    rev = ''.join(tmp)
+            stack.append(ExprNode(token))
+    if len(stack) != 1:
+        raise ValueError("運算式不完整")
+    return stack[0]
+
+def parse_expression(expression):
+    return build_tree(infix_to_postfix(expression))
 
-    # 4. 對上述 rev 字串呼叫後序函式，得到一個 list（postfix of the reversed）
-    postfix_of_rev = infix_to_postfix(rev)
+# 以下三個走訪都用自己的 stack，很長的運算式也不會超過遞迴深度限制
+def tree_to_prefix(root):
+    output = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        output.append(node.value)
+        # 先推右邊，讓左邊先被處理
+        if node.right is not None:
+            stack.append(node.right)
+        if node.left is not None:
+            stack.append(node.left)
+    return output
+
+def tree_to_postfix(root):
+    # 「根 → 右 → 左」的順序反過來就是「左 → 右 → 根」
+    output = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        output.append(node.value)
+        if node.left is not None:
+            stack.append(node.left)
+        if node.right is not None:
+            stack.append(node.right)
+    output.reverse()
+    return output
 
-    # 5. 把那個 list 反過來，就變成 prefix
-    prefix_list = postfix_of_rev[::-1]
+def _needs_parens(child, op, is_right):
+    """子節點是運算子且優先度較低（或結合方向不對）時，要加括號"""
+    if child.left is None:
+        return False
+    child_prec, prec = precedence(child.value), precedence(op)
+    if child_prec != prec:
+        return child_prec < prec
+    # 優先度相同：左結合運算子的右邊、右結合運算子的左邊要加括號
+    return is_right != is_right_associative(op)
+
+def tree_to_infix(root):
+    """產生只加必要括號的中序字串"""
+    parts = []
+    stack = [root]  # 裡面放節點或已經決定好的字串
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif item.left is None:
+            parts.append(item.value)
+        elif item.value == UNARY_MINUS:
+            if _needs_parens(item.left, item.value, False):
+                stack.extend([')', item.left, '-('])
+            else:
+                stack.extend([item.left, '-'])
+        else:
+            # 反向推入：右括號、右子樹、運算子、左子樹、左括號
+            if _needs_parens(item.right, item.value, True):
+                stack.extend([')', item.right, '('])
+            else:
+                stack.append(item.right)
+            stack.append(f' {item.value} ')
+            if _needs_parens(item.left, item.value, False):
+                stack.extend([')', item.left, '('])
+            else:
+                stack.append(item.left)
+    return ''.join(parts)
 
-    return prefix_list
+# ========== 新增：前序 (prefix) ==========
+def infix_to_prefix(expression):
+    """
+    先建立運算式樹，再用前序走訪輸出。
+    原本「反轉字串 → 轉後序 → 再反轉」的做法會把多位數（例如 12）反轉成 21，
+    而且整個字串要掃描兩次。
+    """
+    return tree_to_prefix(parse_expression(expression))
 
 # ========== 原本的：計算後序 (postfix) ==========
-def evaluate_postfix(postfix_tokens):
+# variables：變數名稱 → 數值（也可以是 NumPy 陣列，整欄一起計算）
+def evaluate_postfix(postfix_tokens, variables=None):
     stack = []
     for token in postfix_tokens:
         # 如果 token 裡面除了第一個小數點之外，全都是 digit → 視為數字
         if token.replace('.', '', 1).isdigit():
             stack.append(float(token))
+        elif token.isidentifier():
+            if variables is None or token not in variables:
+                raise NameError(f"未定義的變數：{token}")
+            stack.append(variables[token])
+        elif token == UNARY_MINUS:
+            stack.append(-stack.pop())
         else:
             # 否則就是運算子，pop 兩個數做計算
             b = stack.pop()
@@ -706,38 +2739,336 @@ def evaluate_postfix(postfix_tokens):
                 stack.append(a * b)
             elif token == '/':
                 stack.append(a / b)
+            elif token == '**':
+                stack.append(a ** b)
     # 最後 stack 裡剩下的就是答案
     return stack[0]
 
+# ========== 新增：編譯一次、重複計算 ==========
+# 把運算式轉成後序指令 (opcode, 參數) 的 tuple，依運算式字串放在 LRU cache；
+# 同一條公式再次計算時直接執行指令，不再掃描字串或判斷 token 型別。
+import operator
+from functools import lru_cache
+
+EXPRESSION_CACHE_SIZE = 1024
+
+PUSH, LOAD, UNARY, BINARY = 0, 1, 2, 3
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '**': operator.pow,
+}
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression):
+    code = []
+    depth = 0  # 執行到這裡時 stack 的深度，編譯時先檢查，執行時就不必再檢查
+    for token in infix_to_postfix(expression):
+        if token in BINARY_OPERATORS:
+            if depth < 2:
+                raise ValueError(f"運算子 {token} 缺少運算元")
+            code.append((BINARY, BINARY_OPERATORS[token]))
+            depth -= 1
+        elif token == UNARY_MINUS:
+            if depth < 1:
+                raise ValueError("負號缺少運算元")
+            code.append((UNARY, operator.neg))
+        elif token.isidentifier():
+            code.append((LOAD, token))
+            depth += 1
+        else:
+            code.append((PUSH, float(token)))
+            depth += 1
+    if depth != 1:
+        raise ValueError("運算式不完整")
+    return tuple(code)
+
+# 執行編譯好的指令；variables 為變數名稱 → 數值
+def run_compiled(code, variables=None):
+    stack = []
+    push, pop = stack.append, stack.pop
+    for opcode, arg in code:
+        if opcode == PUSH:
+            push(arg)
+        elif opcode == LOAD:
+            if variables is None or arg not in variables:
+                raise NameError(f"未定義的變數：{arg}")
+            push(variables[arg])
+        elif opcode == UNARY:
+            push(arg(pop()))
+        else:
+            b = pop()
+            push(arg(pop(), b))
+    if len(stack) != 1:
+        raise ValueError("運算式不完整")
+    return stack[0]
+
+# 安全的運算式計算：只認得數字、變數與 + - * / ** ( )，不會執行任意程式碼
+def evaluate(expression, variables=None):
+    return run_compiled(compile_expression(expression), variables)
+
+# 幾乎是整數的結果就以整數形式顯示，否則照原樣顯示
+def format_result(value):
+    if isinstance(value, float) and math.isfinite(value) and abs(value - round(value)) < 1e-9:
+        return str(int(round(value)))
+    return str(value)
+
+# ========== 新增：整欄向量化計算 ==========
+# columns：變數名稱 → 一整欄數值；同一份編譯結果一次算完所有列（每個運算子只跑一次陣列運算）
+def evaluate_columns(expression, columns):
+    if np is None:
+        raise ImportError("evaluate_columns 需要安裝 NumPy")
+    arrays = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):  # 除以 0 的列得到 inf / nan，不中斷整批
+        return np.asarray(run_compiled(compile_expression(expression), arrays), dtype=float)
+
+# ========== 新增：後序最佳化（常數折疊、共用子運算式、增量重算） ==========
+def _same_value(old, new):
+    # 只有純量能確定沒變；NumPy 陣列可能被原地修改，即使是同一個物件也當作有變動
+    return isinstance(old, (int, float)) and isinstance(new, (int, float)) and old == new
+
+class OptimizedExpression:
+    """
+    把後序 token 轉成去掉重複的節點表（DAG），節點編號就是計算順序：
+    - 子節點全是常數時，建表時就先算好（constant folding）
+    - 相同的子運算式只保留一個節點（+ 和 * 的兩邊會先排序，a+b 和 b+a 算同一個）
+    - 記住上一次每個節點的結果，下次只重算「用到有變動的變數」的節點
+      （只有 int / float 變數會比對是否相同；陣列等其他值每次都視為有變動，原地修改也不會拿到舊結果）
+    """
+
+    def __init__(self, postfix_tokens):
+        self.ops = []        # 節點的運算函式；常數和變數為 None
+        self.args = []       # 子節點編號
+        self.names = []      # 變數節點的名稱，其他節點為 None
+        self.values = []     # 每個節點上一次的結果（常數節點建表時就有值）
+        self._index = {}     # 節點內容 → 節點編號，用來合併相同子運算式
+        stack = []
+        for token in postfix_tokens:
+            if token == UNARY_MINUS:
+                stack.append(self._operation(operator.neg, (stack.pop(),)))
+            elif token in BINARY_OPERATORS:
+                b = stack.pop()
+                a = stack.pop()
+                if token in ('+', '*') and a > b:
+                    a, b = b, a
+                stack.append(self._operation(BINARY_OPERATORS[token], (a, b)))
+            elif token.isidentifier():
+                stack.append(self._node(('var', token), None, (), token, None))
+            else:
+                stack.append(self._constant(float(token)))
+        if len(stack) != 1:
+            raise ValueError("運算式不完整")
+        self.root = stack[0]
+        del self._index
+
+        # 每個變數會影響到哪些節點（依節點編號排序，也就是計算順序）
+        depends = []
+        for i, args in enumerate(self.args):
+            names = {self.names[i]} if self.names[i] is not None else set()
+            for j in args:
+                names |= depends[j]
+            depends.append(names)
+        self.dependents = {name: [i for i, names in enumerate(depends) if name in names]
+                           for name in set(filter(None, self.names))}
+        self._last = None  # 上一次成功計算時的變數值
+
+    def _node(self, key, op, args, name, value):
+        node = self._index.get(key)
+        if node is None:
+            node = len(self.ops)
+            self._index[key] = node
+            self.ops.append(op)
+            self.args.append(args)
+            self.names.append(name)
+            self.values.append(value)
+        return node
+
+    def _constant(self, value):
+        # 用 repr 當 key，0.0 和 -0.0 才不會被合併
+        return self._node(('const', repr(value)), None, (), None, value)
+
+    def _is_constant(self, node):
+        return self.ops[node] is None and self.names[node] is None
+
+    def _operation(self, op, args):
+        if all(self._is_constant(j) for j in args):
+            try:
+                return self._constant(op(*[self.values[j] for j in args]))
+            except ArithmeticError:
+                pass  # 例如 1/0：保留節點，讓錯誤在計算時才出現
+        return self._node((op, args), op, args, None, None)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def evaluate(self, variables=None):
+        variables = variables or {}
+        for name in self.dependents:
+            if name not in variables:
+                raise NameError(f"未定義的變數：{name}")
+        if self._last is None:
+            dirty = range(len(self.ops))
+        else:
+            changed = [name for name, old in self._last.items() if not _same_value(old, variables[name])]
+            if not changed:
+                return self.values[self.root]
+            if len(changed) == 1:
+                dirty = self.dependents[changed[0]]
+            else:
+                dirty = sorted(set().union(*(self.dependents[name] for name in changed)))
+
+        self._last = None  # 中途出錯時，下次要整個重算
+        ops, args, names, values = self.ops, self.args, self.names, self.values
+        for i in dirty:
+            op = ops[i]
+            if op is not None:
+                values[i] = op(*[values[j] for j in args[i]])
+            elif names[i] is not None:
+                values[i] = variables[names[i]]
+        self._last = {name: variables[name] for name in self.dependents}
+        return values[self.root]
+
+def optimize_postfix(postfix_tokens):
+    return OptimizedExpression(postfix_tokens)
+
+def optimize_expression(expression):
+    return OptimizedExpression(infix_to_postfix(expression))
+
+# ========== 新增：批次計算（多行 → worker pool） ==========
+EXPRESSION_BATCH_SIZE = 10000  # 每批讀幾行，記憶體只保留一批
+EXPRESSION_CHUNK_SIZE = 256    # 一次丟給 worker 幾行，減少行程間往返
+
+def _evaluate_line(expression):
+    """worker 端：算一行；失敗時回傳錯誤訊息，不讓整批中斷"""
+    try:
+        return evaluate(expression), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _iter_expression_batches(lines, batch_size):
+    batch = []
+    for line in lines:
+        line = line.strip()
+        if not line:  # 略過空行
+            continue
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def evaluate_batches(lines, batch_size=EXPRESSION_BATCH_SIZE, workers=None,
+                     chunksize=EXPRESSION_CHUNK_SIZE):
+    """
+    逐批計算，每批產生 (expressions, results, elapsed)。
+    results 和 expressions 順序相同，每個元素是 (value, error)。
+    workers=1 時不開 worker pool，直接在本行程計算。
+    """
+    if workers == 1:
+        for batch in _iter_expression_batches(lines, batch_size):
+            start = time.perf_counter()
+            results = list(map(_evaluate_line, batch))
+            yield batch, results, time.perf_counter() - start
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in _iter_expression_batches(lines, batch_size):
+            start = time.perf_counter()
+            # pool.map 會依照輸入順序回傳結果
+            results = list(pool.map(_evaluate_line, batch, chunksize=chunksize))
+            yield batch, results, time.perf_counter() - start
+
+def run_batch(source=None, output=None, report=None, batch_size=EXPRESSION_BATCH_SIZE,
+              workers=None, chunksize=EXPRESSION_CHUNK_SIZE):
+    """
+    從檔案（source 為路徑）或 stdin（source 為 None 或 '-'）逐行讀取運算式並計算。
+    結果依原順序寫到 output（預設 stdout），每批的延遲與吞吐量寫到 report（預設 stderr）。
+    """
+    output = output or sys.stdout
+    report = report or sys.stderr
+    stream = sys.stdin if source in (None, '-') else open(source, encoding='utf-8')
+    total_count = total_errors = 0
+    start = time.perf_counter()
+    try:
+        batches = evaluate_batches(stream, batch_size, workers, chunksize)
+        for index, (expressions, results, elapsed) in enumerate(batches, 1):
+            errors = 0
+            for expression, (value, error) in zip(expressions, results):
+                if error is None:
+                    output.write(f"{expression} = {format_result(value)}\n")
+                else:
+                    output.write(f"{expression} -> {error}\n")
+                    errors += 1
+            total_count += len(expressions)
+            total_errors += errors
+            rate = len(expressions) / max(elapsed, 1e-9)
+            report.write(f"batch {index}: {len(expressions)} expressions, {errors} errors, "
+                         f"{elapsed * 1000:.1f} ms, {rate:.0f} expr/s\n")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    total_elapsed = time.perf_counter() - start
+    report.write(f"total: {total_count} expressions, {total_errors} errors, {total_elapsed:.3f} s, "
+                 f"{total_count / max(total_elapsed, 1e-9):.0f} expr/s\n")
+    return {"expressions": total_count, "errors": total_errors, "seconds": total_elapsed}
+
 # ========== 主程式 ==========
-if __name__ == '__main__':
+# 加上 --expr-batch [檔案] 參數時改成批次模式（沒給檔案就讀 stdin）；
+# 前面的互動式區段都會跳過，算完直接結束，後面的範例輸出才不會混進結果
+if __name__ == '__main__' and "--expr-batch" in sys.argv:
+    flag = sys.argv.index("--expr-batch")
+    run_batch(sys.argv[flag + 1] if flag + 1 < len(sys.argv) else None)
+    sys.exit()
+elif __name__ == '__main__':
     expr = input("Enter infix expression (e.g., 2 + 3 * 4): ").strip()
 
-    # 顯示「中序」── 就是使用者輸入的那條字串
-    print("Infix:   ", expr)
+    try:
+        # 只切一次 token、建一次運算式樹，三種表示法都從同一棵樹輸出
+        postfix_tokens = infix_to_postfix(expr)
+        tree = build_tree(postfix_tokens)
 
-    # Step 1: 轉成 Prefix
-    prefix_tokens = infix_to_prefix(expr)
-    # 以空格分隔 token 印出
-    print("Prefix:  ", ' '.join(prefix_tokens))
+        # 顯示「中序」── 由運算式樹重新產生（只保留必要的括號）
+        print("Infix:   ", tree_to_infix(tree))
 
-    # Step 2: 轉成 Postfix
-    postfix_tokens = infix_to_postfix(expr)
-    print("Postfix: ", ' '.join(postfix_tokens))
+        # Step 1: 前序
+        prefix_tokens = tree_to_prefix(tree)
+        # 以空格分隔 token 印出
+        print("Prefix:  ", ' '.join(prefix_tokens))
 
-    # Step 3: 計算 Postfix（或你也可以寫 prefix evaluator，但這裡直接重用原來的後序計算）
-    try:
+        # Step 2: 後序
+        print("Postfix: ", ' '.join(postfix_tokens))
+
+        # Step 3: 計算 Postfix（或你也可以寫 prefix evaluator，但這裡直接重用原來的後序計算）
         result = evaluate_postfix(postfix_tokens)
-        # 如果你想把整數顯示成整數格式，可以再檢查一下小數部分是否為 .0
-        if abs(result - int(result)) < 1e-9:
-            # 幾乎是整數，就以整數形式顯示
-            print("Result:  ", int(result))
-        else:
-            # 否則就顯示浮點數
-            print("Result:  ", result)
+        # 幾乎是整數就以整數形式顯示，否則顯示浮點數
+        print("Result:  ", format_result(result))
     except Exception as e:
         print("Evaluation error. Please check your expression. Error:", e)
 #------------------------------------------------
+
+# -*- coding: utf-8 -*-
+"""
+Program Function:
+ 1. Prompt the user to enter an infix expression (e.g., 3+4*2/(1-5)**2)
+ 2. Calculate and display the result of the expression
+"""
+
+# Prompt the user to input an expression
+expr = input("Please enter an infix expression (e.g., 3+4*2): ")
+
+try:
+    # Use the safe evaluator from the infix section instead of eval(),
+    # so the input can only contain numbers, variables and arithmetic operators
+    result = evaluate(expr)
+    # Display the full expression and the result (integers without a trailing .0)
+    print(f"{expr} = {format_result(result)}")
+except Exception as e:
+    # Catch any input errors and display a warning
+    print("Calculation failed. Please make sure your input is a valid arithmetic expression.")
+    print("Error message:", e)
+#-------------------------------------------------
 from collections import deque
 
 # 建立一個票號隊列，從 1 到 20
@@ -916,6 +3247,7 @@ if __name__ == "__main__":
     print("\nToday's total sales:", shop.total_sales())
     print("Average spending per customer:", shop.average_spending())
 #------------------------------------------------------
+from collections import deque
 
 class AVLNode:
     def __init__(self, key, weight):
@@ -977,11 +3309,12 @@ class AVLTree:
         return y  # 新根
 
     # ---------- 插入節點 ----------
+    # 節點依 (流量, 道路) 排序：流量相同時再比道路名稱，旋轉後也不會有相同的排序鍵跑到左邊
     def insert(self, node, key, weight):
         # 1. 標準 BST 插入
         if not node:
             return AVLNode(key, weight)
-        if weight < node.weight:
+        if (weight, key) < (node.weight, node.key):
             node.left = self.insert(node.left, key, weight)
         else:
             node.right = self.insert(node.right, key, weight)
@@ -994,18 +3327,18 @@ class AVLTree:
 
         # 4. 處理四種失衡情境
         # LL
-        if balance > 1 and weight < node.left.weight:
+        if balance > 1 and (weight, key) < (node.left.weight, node.left.key):
             return self.right_rotate(node)
         # RR
-        if balance < -1 and weight >= node.right.weight:
+        if balance < -1 and (weight, key) >= (node.right.weight, node.right.key):
             return self.left_rotate(node)
         # LR
-        if balance > 1 and weight >= node.left.weight:
+        if balance > 1 and (weight, key) >= (node.left.weight, node.left.key):
             node.left = self.left_rotate(node.left)
             print(f"先左旋再右旋 (LR) 在節點 {node.key}")
             return self.right_rotate(node)
         # RL
-        if balance < -1 and weight < node.right.weight:
+        if balance < -1 and (weight, key) < (node.right.weight, node.right.key):
             node.right = self.right_rotate(node.right)
             print(f"先右旋再左旋 (RL) 在節點 {node.key}")
             return self.left_rotate(node)
@@ -1018,13 +3351,18 @@ class AVLTree:
         return node
 
     # ---------- 刪除節點 ----------
-    def delete(self, node, weight):
+    def delete(self, node, weight, key=None):
+        # key 為 None 時只比流量（刪掉任一條該流量的道路）；有 key 時用 (流量, 道路) 精確定位
         if not node:
             return node
-        if weight < node.weight:
-            node.left = self.delete(node.left, weight)
-        elif weight > node.weight:
-            node.right = self.delete(node.right, weight)
+        if key is None:
+            target, current = weight, node.weight
+        else:
+            target, current = (weight, key), (node.weight, node.key)
+        if target < current:
+            node.left = self.delete(node.left, weight, key)
+        elif target > current:
+            node.right = self.delete(node.right, weight, key)
         else:
             # 找到要刪除的節點
             if not node.left:
@@ -1034,7 +3372,7 @@ class AVLTree:
             # 兩子樹皆有：取右子樹最小值頂替
             temp = self.get_min_value_node(node.right)
             node.key, node.weight = temp.key, temp.weight
-            node.right = self.delete(node.right, temp.weight)
+            node.right = self.delete(node.right, temp.weight, temp.key)
 
         # 更新高度
         node.height = max(self.get_height(node.left), self.get_height(node.right)) + 1
@@ -1063,15 +3401,8 @@ class AVLTree:
     # ---------- 替代路線推薦 ----------
     def recommend_alternative(self, congested_node):
         # 遍歷整棵樹，找出流量低於 congested_node.weight 的節點
-        alternatives = []
-        def dfs(n):
-            if not n:
-                return
-            if n.weight < congested_node.weight:
-                alternatives.append((n.key, n.weight))
-            dfs(n.left)
-            dfs(n.right)
-        dfs(self.root)
+        alternatives = [(n.key, n.weight) for n in self.iter_preorder(self.root)
+                        if n.weight < congested_node.weight]
 
         # 根據流量由低到高排序，取前 5 筆
         alternatives.sort(key=lambda x: x[1])
@@ -1087,13 +3418,80 @@ class AVLTree:
         """關閉道路 (刪除節點)，以流量當識別"""
         self.root = self.delete(self.root, weight)
 
+    def _build_balanced(self, roads, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        node = AVLNode(*roads[mid])
+        node.left = self._build_balanced(roads, lo, mid)
+        node.right = self._build_balanced(roads, mid + 1, hi)
+        node.height = max(self.get_height(node.left), self.get_height(node.right)) + 1
+        return node
+
+    def bulk_load(self, roads):
+        """一次載入大量 (道路, 流量)：依流量排序一次後直接建成平衡樹，O(n)（已排序的輸入排序只需線性時間）"""
+        ordered = sorted(roads, key=lambda road: (road[1], road[0]))
+        self.root = self._build_balanced(ordered, 0, len(ordered))
+
+    def merge_roads(self, roads):
+        """批次新增道路：與現有道路依流量合併後重建，O(n + m log m)"""
+        existing = [(n.key, n.weight) for n in self.iter_inorder(self.root)]
+        self.bulk_load(existing + list(roads))
+
     def inorder(self, node):
         """中序列印 (可用於偵錯)"""
-        if not node:
-            return
-        self.inorder(node.left)
-        print(f"{node.key}:{node.weight}", end="  ")
-        self.inorder(node.right)
+        for n in self.iter_inorder(node):
+            print(f"{n.key}:{n.weight}", end="  ")
+
+    # ---------- 走訪 (generator，不遞迴) ----------
+    def iter_inorder(self, node):
+        """依流量由低到高產生節點"""
+        stack = []
+        current = node
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            yield current
+            current = current.right
+
+    def iter_preorder(self, node):
+        """根 → 左 → 右"""
+        stack = [node] if node else []
+        while stack:
+            n = stack.pop()
+            yield n
+            if n.right:
+                stack.append(n.right)
+            if n.left:
+                stack.append(n.left)
+
+    def iter_level_order(self, node):
+        """逐層產生節點"""
+        queue = deque([node] if node else [])
+        while queue:
+            n = queue.popleft()
+            yield n
+            if n.left:
+                queue.append(n.left)
+            if n.right:
+                queue.append(n.right)
+
+    def iter_range(self, node, low, high):
+        """依序產生流量介於 low 與 high（含）之間的道路"""
+        stack = []
+        current = node
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left if current.weight >= low else None
+            n = stack.pop()
+            if n.weight > high:
+                return
+            if n.weight >= low:
+                yield n
+            current = n.right
 
 # ------------------- 使用範例 -------------------
 if __name__ == "__main__":
@@ -1264,6 +3662,8 @@ if __name__ == "__main__":
     print("Heap after popping top:", heap.display_heap())
 
 #---------------------------------------------------------
+from collections import deque
+
 # Node class for BST
 class Node:
     def __init__(self, name, score):
@@ -1276,15 +3676,24 @@ class Node:
 def insert(root, name, score):
     """
     Insert a node with given name and score into BST.
-    The BST is ordered by score.
+    The BST is ordered by (score, name), so equal scores are still a strict order
+    and a balanced bulk-loaded tree stays valid. Iterative, no recursion limit.
     """
+    node = Node(name, score)
     if root is None:
-        return Node(name, score)
-    if score < root.score:
-        root.left = insert(root.left, name, score)
-    else:
-        root.right = insert(root.right, name, score)
-    return root
+        return node
+    current = root
+    while True:
+        if (score, name) < (current.score, current.name):
+            if current.left is None:
+                current.left = node
+                return root
+            current = current.left
+        else:
+            if current.right is None:
+                current.right = node
+                return root
+            current = current.right
 
 # Function to find the node with minimum score in BST (used in deletion)
 def find_min(node):
@@ -1297,45 +3706,146 @@ def find_min(node):
     return current
 
 # Function to delete a node by score
-def delete_node(root, score):
+def delete_node(root, score, name=None):
     """
     Delete the node with given score from BST.
+    Pass name to pick a specific record when several share the score.
     """
-    if root is None:
-        return None
-    if score < root.score:
-        root.left = delete_node(root.left, score)
-    elif score > root.score:
-        root.right = delete_node(root.right, score)
+    parent = None
+    current = root
+    while current is not None:
+        if name is None:
+            target, key = score, current.score
+        else:
+            target, key = (score, name), (current.score, current.name)
+        if target == key:
+            break
+        parent = current
+        current = current.left if target < key else current.right
+    if current is None:
+        return root
+    # Two children: copy the inorder successor (smallest in right subtree) here, then unlink it
+    if current.left is not None and current.right is not None:
+        parent = current
+        successor = current.right
+        while successor.left is not None:
+            parent = successor
+            successor = successor.left
+        current.name = successor.name
+        current.score = successor.score
+        current = successor
+    # Now current has at most one child
+    child = current.left if current.left is not None else current.right
+    if parent is None:
+        return child
+    if parent.left is current:
+        parent.left = child
     else:
-        # Node to be deleted found
-        # Case 1: No child or one child
-        if root.left is None:
-            return root.right
-        elif root.right is None:
-            return root.left
-        # Case 2: Two children: get inorder successor (smallest in right subtree)
-        temp = find_min(root.right)
-        # Copy the inorder successor's content to this node
-        root.name = temp.name
-        root.score = temp.score
-        # Delete the inorder successor
-        root.right = delete_node(root.right, temp.score)
+        parent.right = child
     return root
 
+# Lazy, iterative traversals (generators, no recursion)
+def iter_inorder(root):
+    """Yield nodes in ascending score order."""
+    stack = []
+    current = root
+    while stack or current:
+        while current:
+            stack.append(current)
+            current = current.left
+        current = stack.pop()
+        yield current
+        current = current.right
+
+def iter_preorder(root):
+    """Yield nodes root first, then left and right subtrees."""
+    stack = [root] if root else []
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.right:
+            stack.append(node.right)
+        if node.left:
+            stack.append(node.left)
+
+def iter_level_order(root):
+    """Yield nodes level by level."""
+    queue = deque([root] if root else [])
+    while queue:
+        node = queue.popleft()
+        yield node
+        if node.left:
+            queue.append(node.left)
+        if node.right:
+            queue.append(node.right)
+
+def iter_range(root, low, high):
+    """Yield nodes with low <= score <= high in score order."""
+    stack = []
+    current = root
+    while stack or current:
+        while current:
+            stack.append(current)
+            current = current.left if current.score >= low else None
+        node = stack.pop()
+        if node.score > high:
+            return
+        if node.score >= low:
+            yield node
+        current = node.right
+
+def iter_sideways(root):
+    """
+    Yield (node, level) in reverse in-order (right subtree first),
+    the order used by print_tree.
+    """
+    stack = []
+    current, level = root, 0
+    while stack or current:
+        while current:
+            stack.append((current, level))
+            current, level = current.right, level + 1
+        node, level = stack.pop()
+        yield node, level
+        current, level = node.left, level + 1
+
+# Build a perfectly balanced BST from (name, score) records sorted by (score, name)
+def _build_balanced(items):
+    """The midpoint of each range becomes its root; built with an explicit stack, no recursion."""
+    holder = Node(None, None)
+    stack = [(holder, 'left', 0, len(items))]
+    while stack:
+        parent, side, lo, hi = stack.pop()
+        if lo >= hi:
+            continue
+        mid = (lo + hi) // 2
+        node = Node(*items[mid])
+        setattr(parent, side, node)
+        stack.append((node, 'left', lo, mid))
+        stack.append((node, 'right', mid + 1, hi))
+    return holder.left
+
+def bulk_load(records):
+    """
+    Sort (name, score) records once by (score, name) and build a balanced BST in O(n).
+    Already-sorted input only costs a linear pass in sorted().
+    """
+    items = sorted(records, key=lambda record: (record[1], record[0]))
+    return _build_balanced(items)
+
+def merge(root, records):
+    """Insert a large batch: merge with the existing in-order nodes and rebuild, O(n + m log m)."""
+    existing = [(node.name, node.score) for node in iter_inorder(root)]
+    return bulk_load(existing + list(records))
+
 # Function to print BST structure in text (sideways)
 def print_tree(node, level=0):
     """
     Print the BST structure in a sideways textual format.
     Right subtree is printed above and left subtree below with indentation.
     """
-    if node is not None:
-        # Print right subtree
-        print_tree(node.right, level + 1)
-        # Print current node with indentation
-        print('    ' * level + f'({node.name}, {node.score})')
-        # Print left subtree
-        print_tree(node.left, level + 1)
+    for current, depth in iter_sideways(node):
+        print('    ' * (level + depth) + f'({current.name}, {current.score})')
 
 # Main code
 if __name__ == "__main__":